@@ -3,6 +3,15 @@ from core.search.react_agent import ReactAgent
 import os
 import json
 from core.event_process.raw_text_process import EventProcessor
+from core.save_to_db.timeline_snapshot import (load_timeline_snapshot, get_timeline_changes, get_window_index,
+                                               encode_cursor, decode_cursor)
+from core.save_to_db.timeline_aggregate import get_timeline_buckets, ZOOM_LEVELS
+from core.search.event_detail import get_event_details
+from utils.relation_graph import get_relation_graph
+from utils.get_emb import get_emb_stats
+from utils.db_pool import LanceDBPool
+from utils.constants import (TIMELINE_PAGE_LIMIT, TIMELINE_PAGE_MAX_LIMIT, TIMELINE_BUCKET_TOP_N, EVENT_DETAIL_BATCH_MAX,
+                             RELATION_GRAPH_MAX_HOPS, RELATION_GRAPH_MAX_NODES, RELATION_PATH_MAX_DEPTH)
 from utils.llm_api import LLMProcessor
 from utils.sql_connector import SQLConnector  
 import re
@@ -72,6 +81,12 @@ def home():
 
 @app.route('/get_directory_structure')
 async def get_directory_structure():
+    """
+    返回用户的时间线
+
+    不带参数时返回全部条目；带 from_year、to_year、limit 或 cursor 时只返回与年份窗口相交的一页，
+    格式为 {version, timeline, next_cursor}。
+    """
     print("✓ 获取目录结构")
     try:
         if not g.user_id:
@@ -81,39 +96,41 @@ async def get_directory_structure():
         user_db_path = g.user_db_path
         print(user_db_path)
         
+        paged = any(name in request.args for name in ('from_year', 'to_year', 'limit', 'cursor'))
+        from_year = request.args.get('from_year', type=int)
+        to_year = request.args.get('to_year', type=int)
+        limit = min(max(request.args.get('limit', TIMELINE_PAGE_LIMIT, type=int), 1), TIMELINE_PAGE_MAX_LIMIT)
+        try:
+            after = decode_cursor(request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         # 如果用户的lancedb目录不存在或为空，返回空列表
         if not os.path.exists(user_db_path) or not os.listdir(user_db_path):
+            if paged:
+                return jsonify({'version': 0, 'timeline': [], 'next_cursor': None})
             return jsonify([])
         
-        print("✓ 连接数据库")
         try:
-            db_lance = await lancedb.connect_async(user_db_path)
-            # 检查表是否存在
-            if "detail_table" not in await db_lance.table_names():
-                return jsonify([])
-            print("✓ 确保detail_table表存在")
-            tbl = await db_lance.open_table("detail_table")
-            result = await tbl.query().where('field = "summary"').limit(1000).to_pandas()
-       
-
-            timeline_data = []
-            event_list = []
-            for index, row in result.iterrows():
-                time = await tbl.query().where('field = "time" and event = "{}"'.format(row['event'])).limit(1000).to_pandas()
-                if row['event'] not in event_list:
-                    event_list.append(row['event'])
-                
-                    timeline_data.append({
-                        "title": row["title"],
-                        "time": time.iloc[0]['text'],
-                        "event": row["text"],
-                        "file": row['event'],
-                        "dir": time.iloc[0]['text']
-                    })
-
-            timeline_data.sort(key=lambda x: x['time'])
-         
-            return jsonify(timeline_data)
+            snapshot = await load_timeline_snapshot(user_db_path)
+            # 分页请求的缓存键包含查询参数，ETag 只随快照版本变化
+            etag = f'"timeline-{snapshot["version"]}"'
+            # 快照未变化时客户端直接使用缓存
+            if request.headers.get('If-None-Match') == etag:
+                return Response(status=304, headers={'ETag': etag})
+
+            if paged:
+                entries, last_order = get_window_index(user_db_path, snapshot).window(from_year, to_year, limit, after)
+                response = jsonify({
+                    'version': snapshot['version'],
+                    'timeline': entries,
+                    'next_cursor': encode_cursor(last_order) if last_order else None,
+                })
+            else:
+                response = jsonify(snapshot['timeline'])
+            response.headers['ETag'] = etag
+            response.headers['X-Timeline-Version'] = str(snapshot['version'])
+            return response
         except Exception as e:
             print(f"获取用户时间线数据出错: {e}")
            
@@ -126,19 +143,53 @@ async def get_directory_structure():
     
 
 
-async def get_relate_events(event, user_db_path):
-    db = await lancedb.connect_async(user_db_path)
-    tbl = await db.open_table("relations_table")
-    result = await tbl.query().where('event_1 = "{}"'.format(event)).limit(1000).to_pandas()
-    
-    related_items = []
-    for index, row in result.iterrows():
-        related_items.append({
-            "event": row['event_2'],
-            "reason": row['relation']
-        })
-    
-    return related_items
+@app.route('/get_timeline_changes')
+async def get_timeline_changes_route():
+    """返回客户端已有版本之后新增或变化的时间线条目"""
+    if not g.user_id:
+        return jsonify({'error': '请先登录'}), 401
+
+    since = request.args.get('since', type=int)
+    user_db_path = g.user_db_path
+    if not os.path.exists(user_db_path) or not os.listdir(user_db_path):
+        return jsonify({'version': 0, 'full': True, 'added': [], 'changed': []})
+
+    try:
+        snapshot = await load_timeline_snapshot(user_db_path)
+        return jsonify(get_timeline_changes(snapshot, since))
+    except Exception as e:
+        print(f"获取时间线变化时出错: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/get_timeline_buckets')
+async def get_timeline_buckets_route():
+    """时间线缩小时按年代、世纪或朝代返回分组计数和代表事件"""
+    if not g.user_id:
+        return jsonify({'error': '请先登录'}), 401
+
+    level = request.args.get('level', 'century')
+    if level not in ZOOM_LEVELS:
+        return jsonify({'error': f'level 只能是 {", ".join(ZOOM_LEVELS)}'}), 400
+    top_n = min(max(request.args.get('top_n', TIMELINE_BUCKET_TOP_N, type=int), 1), 50)
+
+    user_db_path = g.user_db_path
+    if not os.path.exists(user_db_path) or not os.listdir(user_db_path):
+        return jsonify({'version': 0, 'level': level, 'buckets': [], 'undated': 0})
+
+    try:
+        result = await get_timeline_buckets(user_db_path, level, top_n)
+        etag = f'"timeline-{result["version"]}"'
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=304, headers={'ETag': etag})
+
+        response = jsonify(result)
+        response.headers['ETag'] = etag
+        return response
+    except Exception as e:
+        print(f"获取时间线分组时出错: {e}")
+        return jsonify({'error': str(e)}), 500
+
 
 @app.route('/get_file_content', methods=['POST'])
 async def get_file_content():
@@ -152,48 +203,94 @@ async def get_file_content():
         if not file_name:
             return jsonify({'error': '未提供文件名'}), 400
             
-        # 使用全局变量中的用户数据库路径
-        db_lance = await lancedb.connect_async(g.user_db_path)
-        if "detail_table" not in await db_lance.table_names():
-            return jsonify({'error': '未找到数据表'}), 404
-            
-        tbl = await db_lance.open_table("detail_table")
-        result = await tbl.query().where(f'event = "{file_name}"').to_pandas()
-        
-        if result.empty:
+        details = await get_event_details([file_name], g.user_db_path)
+        if file_name not in details:
             return jsonify({'error': '未找到文件内容'}), 404
+
+        return jsonify(details[file_name])
         
-        # 按照title分组内容
-        content_by_title = {}
-        
-        for index, row in result.iterrows():
-            title = row.get('title', '未命名')
-            
-            if title not in content_by_title:
-                content_by_title[title] = {}
-            
-            if row['field'] == 'summary':
-                content_by_title[title]['summary'] = row["text"]
-            elif row['field'] == 'character_thought':
-                content_by_title[title]['character_thought'] = row["text"]
-            elif row['field'] == 'author_view':
-                content_by_title[title]['author_view'] = row["text"]
-            elif row['field'] == 'time':
-                content_by_title[title]['time'] = row["text"]
-
-        # 获取相关事件
-        print("获取相关事件")
-        print(file_name)
-        related_events = await get_relate_events(file_name, g.user_db_path)
-        print(related_events)
-        return jsonify({
-            'content_by_title': content_by_title,
-            'related_events': related_events
-        })
-        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@app.route('/get_event_details', methods=['POST'])
+async def get_event_details_route():
+    """批量返回事件详情和相关事件，供关系网络预取相邻事件"""
+    if not g.user_id:
+        return jsonify({'error': '请先登录'}), 401
+
+    try:
+        events = (request.json or {}).get('events')
+        if not isinstance(events, list) or not events:
+            return jsonify({'error': '未提供事件列表'}), 400
+        if len(events) > EVENT_DETAIL_BATCH_MAX:
+            return jsonify({'error': f'一次最多查询 {EVENT_DETAIL_BATCH_MAX} 个事件'}), 400
+
+        if not os.path.exists(g.user_db_path) or not os.listdir(g.user_db_path):
+            return jsonify({'events': {}})
+
+        details = await get_event_details([str(event) for event in events], g.user_db_path)
+        return jsonify({'events': details})
+
+    except Exception as e:
+        print(f"批量获取事件详情时出错: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/get_event_graph')
+async def get_event_graph():
+    """返回事件周围 hops 跳内的关系网络"""
+    if not g.user_id:
+        return jsonify({'error': '请先登录'}), 401
+
+    event = request.args.get('event')
+    if not event:
+        return jsonify({'error': '未提供事件名称'}), 400
+    hops = min(max(request.args.get('hops', 1, type=int), 1), RELATION_GRAPH_MAX_HOPS)
+    max_nodes = min(max(request.args.get('limit', RELATION_GRAPH_MAX_NODES, type=int), 1), RELATION_GRAPH_MAX_NODES)
+
+    if not os.path.exists(g.user_db_path) or not os.listdir(g.user_db_path):
+        return jsonify({'nodes': [{'event': event, 'distance': 0}], 'edges': [], 'truncated': False})
+
+    try:
+        graph = await get_relation_graph(g.user_db_path)
+        return jsonify(graph.k_hop(event, hops, max_nodes))
+    except Exception as e:
+        print(f"获取关系网络时出错: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/get_event_path')
+async def get_event_path():
+    """返回两个事件之间的最短关系路径"""
+    if not g.user_id:
+        return jsonify({'error': '请先登录'}), 401
+
+    source = request.args.get('source')
+    target = request.args.get('target')
+    if not source or not target:
+        return jsonify({'error': '未提供起点或终点事件'}), 400
+    max_depth = min(max(request.args.get('max_depth', RELATION_PATH_MAX_DEPTH, type=int), 1), RELATION_PATH_MAX_DEPTH)
+
+    if not os.path.exists(g.user_db_path) or not os.listdir(g.user_db_path):
+        return jsonify({'found': False, 'edges': []})
+
+    try:
+        graph = await get_relation_graph(g.user_db_path)
+        edges = graph.shortest_path(source, target, max_depth)
+        return jsonify({'found': edges is not None, 'edges': edges or []})
+    except Exception as e:
+        print(f"查找关系路径时出错: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cache_stats')
+def cache_stats():
+    """返回进程内向量缓存、请求合并器和 LanceDB 连接池的统计"""
+    if not g.user_id:
+        return jsonify({'error': '请先登录'}), 401
+
+    return jsonify({'embedding': get_emb_stats(), 'lancedb_pool': LanceDBPool().get_stats()})
+
 @app.route('/status_stream')
 def status_stream():
     """SSE端点，用于发送处理状态更新"""
@@ -11,8 +11,12 @@ from utils.extract_bili_content import extract_content_from_bili
 from utils.status_manager import StatusManager
 from core.save_to_db.split_summary import process_summary
 from utils.llm_api import LLMProcessor
-from utils.get_emb import check_exists_event
-from core.save_to_db.save_metadata import save_metadata_emb, save_relations
+from utils.llm_limiter import run_llm
+from utils.get_emb import check_exists_event, check_exists_events, aget_emb_batch
+from utils.time_normalizer import normalize_time
+from core.save_to_db.save_metadata import save_metadata_emb, save_relations, build_metadata_table
+from core.save_to_db.timeline_snapshot import load_timeline_snapshot, update_timeline_snapshot
+from core.save_to_db.document_batch import DocumentBatch
 
 
 class EventProcessor:
@@ -66,27 +70,42 @@ class EventProcessor:
         """
         处理原始文本的完整工作流
 
+        各步骤产生的写入先收集到文档的写入批次中，全部处理完后每张表一次写入，
+        处理或提交失败时不会留下写了一半的数据。
+
         Args:
             file_name: 文件名
             text: 文本内容
             user_db_path: 用户数据库路径
             user_id: 用户ID
         """
-        # 1. 分析文本内容，提取事件
-        timeline_events = await self._extract_timeline_events(text, user_id)
-        
-        # 2. 处理文本摘要
-        await process_summary(text, file_name, user_db_path)
-        
-        # 3. 根据时间创建文件并处理事件
-        await self._process_events_by_time(text, timeline_events, file_name, user_db_path, user_id)
+        batch = DocumentBatch(user_db_path)
+        try:
+            # 1. 分析文本内容，提取事件
+            timeline_events = await self._extract_timeline_events(text, user_db_path, user_id)
+
+            # 2. 处理文本摘要
+            await process_summary(text, file_name, user_db_path, batch)
 
-    async def _extract_timeline_events(self, text: str, user_id: Optional[str]) -> List[Dict]:
+            # 3. 根据时间创建文件并处理事件
+            await self._process_events_by_time(text, timeline_events, file_name, user_db_path, user_id, batch)
+        except Exception:
+            batch.discard()
+            raise
+
+        # 4. 一次提交文档的全部写入
+        if user_id:
+            self._update_status(user_id, "正在保存")
+        await batch.commit()
+
+    async def _extract_timeline_events(self, text: str, user_db_path: Optional[str],
+                                       user_id: Optional[str]) -> List[Dict]:
         """
         从文本中提取事件
 
         Args:
             text: 文本内容
+            user_db_path: 用户数据库路径，用于限制该用户的并发请求
             user_id: 用户ID
 
         Returns:
@@ -96,7 +115,9 @@ class EventProcessor:
         if user_id:
             self._update_status(user_id, "正在分析文本内容")
             
-        timeline_response = self.processor.generate_response(
+        timeline_response = await run_llm(
+            user_db_path,
+            self.processor.generate_response,
             "raw_text_process", 
             text, 
             output_format='json',
@@ -108,7 +129,7 @@ class EventProcessor:
 
     async def _process_events_by_time(self, text: str, events: List[Dict], 
                                      file_name: str, user_db_path: str, 
-                                     user_id: Optional[str]) -> None:
+                                     user_id: Optional[str], batch: Optional[DocumentBatch] = None) -> None:
         """
         根据文本和事件列表处理事件
 
@@ -118,6 +139,7 @@ class EventProcessor:
             file_name: 文件名
             user_db_path: 用户数据库路径
             user_id: 用户ID
+            batch: 文档的写入批次，为空时各步骤立即写入
         """
 
 
@@ -128,13 +150,13 @@ class EventProcessor:
         time_list, event_titles = self._extract_time_and_titles(events)
         
         # 2. 检查事件是否存在并获取保存目录
-        saving_dirs = await self._get_saving_directories(time_list, event_titles, user_db_path)
+        saving_dirs = await self._get_saving_directories(time_list, event_titles, user_db_path, batch)
         
         # 3. 处理事件之间的关系
-        await self._handle_event_relations(text, saving_dirs, file_name, user_db_path)
+        await self._handle_event_relations(text, saving_dirs, file_name, user_db_path, batch)
         
         # 4. 处理每个事件的摘要
-        await self._process_individual_events(text, time_list, saving_dirs, file_name, user_db_path, user_id)
+        await self._process_individual_events(text, time_list, saving_dirs, file_name, user_db_path, user_id, batch)
 
     def _extract_time_and_titles(self, events: List[Dict]) -> Tuple[List[str], List[str]]:
         """
@@ -146,12 +168,16 @@ class EventProcessor:
         Returns:
             Tuple[List[str], List[str]]: 时间和标题列表
         """
-        time_list = [event['time'].split("年")[0] for event in events]
+        # 能解析出年份时按起始年份分组，否则沿用"年"之前的文本
+        time_list = []
+        for event in events:
+            start_year, _ = normalize_time(event['time'])
+            time_list.append(str(start_year) if start_year is not None else event['time'].split("年")[0])
         event_titles = [event['event'] for event in events]
         return time_list, event_titles
 
     async def _get_saving_directories(self, time_list: List[str], event_titles: List[str], 
-                                     user_db_path: str) -> List[str]:
+                                     user_db_path: str, batch: Optional[DocumentBatch] = None) -> List[str]:
         """
         获取事件名称，根据名称和时间检查是否已存在
 
@@ -159,15 +185,22 @@ class EventProcessor:
             time_list: 时间列表
             event_titles: 事件标题列表
             user_db_path: 用户数据库路径
+            batch: 文档的写入批次，新事件随文档一起提交
 
         Returns:
             List[str]: 保存事件列表，包含已存在的事件或新事件
         """
 
 
+        title_embs = await aget_emb_batch(event_titles)
+        try:
+            exists_titles = await check_exists_events(event_titles, time_list, user_db_path, title_embs, batch)
+        except Exception as e:
+            print(f"检查事件时出错: {e}", user_db_path)
+            exists_titles = [None] * len(event_titles)
+
         saving_events = []
-        for time, title in zip(time_list, event_titles):
-            exists_title = await self.check_event_exists(title, time, user_db_path)
+        for title, exists_title in zip(event_titles, exists_titles):
             saving_event = exists_title if exists_title else title
             saving_events.append(saving_event)
 
@@ -176,7 +209,8 @@ class EventProcessor:
 
 
     async def _handle_event_relations(self, text: str, saving_dirs: List[str], 
-                                     file_name: str, user_db_path: str) -> None:
+                                     file_name: str, user_db_path: str,
+                                     batch: Optional[DocumentBatch] = None) -> None:
         """
         处理并保存事件之间的关系
 
@@ -185,8 +219,9 @@ class EventProcessor:
             saving_dirs: 保存事件列表
             file_name: 文件名
             user_db_path: 用户数据库路径
+            batch: 文档的写入批次，关系随文档一起提交
         """
-        relations = await self.process_relations(text, saving_dirs, file_name)
+        relations = await self.process_relations(text, saving_dirs, file_name, user_db_path)
         
         # 过滤存在的关系
         relations_to_save = [
@@ -195,13 +230,20 @@ class EventProcessor:
         ]
         
         if relations_to_save:
-            await save_relations(relations_to_save, user_db_path)
+            if batch is not None:
+                batch.add_relations(relations_to_save)
+            else:
+                await save_relations(relations_to_save, user_db_path)
 
     async def _process_individual_events(self, text: str, time_list: List[str], 
                                         saving_dirs: List[str], file_name: str, 
-                                        user_db_path: str, user_id: Optional[str]) -> None:
+                                        user_db_path: str, user_id: Optional[str],
+                                        batch: Optional[DocumentBatch] = None) -> None:
         """
-        处理每个单独的事件
+        并发处理每个单独的事件，并发数受每个用户和全局的大模型请求上限限制
+
+        每个事件的写入先收集到自己的批次，全部完成后按事件原顺序并入文档的批次，
+        单个事件失败时只丢弃该事件的写入，不影响其他事件。
 
         Args:
             text: 文本内容
@@ -210,19 +252,35 @@ class EventProcessor:
             file_name: 文件名
             user_db_path: 用户数据库路径
             user_id: 用户ID
+            batch: 文档的写入批次，事件详情随文档一起提交
         """
-        for time, event in zip(time_list, saving_dirs):
+        async def process(time: str, event: str) -> Optional[DocumentBatch]:
+            event_batch = DocumentBatch(user_db_path) if batch is not None else None
             try:
-                await self.process_event_summary(event, text, time, file_name, user_db_path, user_id)
+                await self.process_event_summary(event, text, time, file_name, user_db_path, user_id, event_batch)
+                return event_batch
             except Exception as e:
                 print(f"处理事件 {event} 时出错: {e}")
                 if user_id:
                     self._update_status(user_id, "错误")
+                return None
+
+        # 与已有事件合并后同一事件可能出现多次，每个事件只总结一次，沿用第一次出现时的时间
+        unique_events = {}
+        for time, event in zip(time_list, saving_dirs):
+            unique_events.setdefault(event, time)
+
+        event_batches = await asyncio.gather(*(process(time, event) for event, time in unique_events.items()))
+        if batch is not None:
+            for event_batch in event_batches:
+                if event_batch is not None:
+                    batch.extend(event_batch)
 
 
     async def process_event_summary(self, event: str, text: str, time: str, 
                                    file_name: str, user_db_path: str, 
-                                   user_id: Optional[str] = None) -> None:
+                                   user_id: Optional[str] = None,
+                                   batch: Optional[DocumentBatch] = None) -> None:
         """
         处理单个事件的摘要并保存
 
@@ -233,12 +291,15 @@ class EventProcessor:
             file_name: 文件名
             user_db_path: 用户数据库路径
             user_id: 用户ID
+            batch: 文档的写入批次，为空时立即保存
         """
         try:
             if user_id:
                 self._update_status(user_id, "正在生成事件摘要")
                 
-            events_summary = self.processor.generate_response(
+            events_summary = await run_llm(
+                user_db_path,
+                self.processor.generate_response,
                 "events_summary", 
                 f"{event}\n\n文章内容：\n{text}", 
                 output_format='json',
@@ -248,14 +309,15 @@ class EventProcessor:
            
             events_summary = json.loads(events_summary)
             events_summary['title'] = event
-            await self.post_process_events(events_summary, time, file_name, user_db_path, user_id)
+            await self.post_process_events(events_summary, time, file_name, user_db_path, user_id, batch)
         except Exception as e:
             print(f"处理事件摘要时出错: {e}")
             if user_id:
                 self._update_status(user_id, "错误")
             raise e
 
-    async def check_event_exists(self, event: str, time_dir: str, user_db_path: str) -> Optional[str]:
+    async def check_event_exists(self, event: str, time_dir: str, user_db_path: str,
+                                 event_emb: Optional[List[float]] = None) -> Optional[str]:
         """
         检查事件是否存在
 
@@ -263,13 +325,15 @@ class EventProcessor:
             event: 事件名称
             time_dir: 时间目录
             user_db_path: 用户数据库路径
+            event_emb: 事件名称的向量，为空时重新计算
         """
-        exists_event = await check_exists_event(event, time_dir, user_db_path)
+        exists_event = await check_exists_event(event, time_dir, user_db_path, event_emb)
         return exists_event if exists_event else None
 
     async def post_process_events(self, events_summary: Dict, time_dir: str, 
                                  file_name: str, user_db_path: str, 
-                                 user_id: Optional[str] = None) -> None:
+                                 user_id: Optional[str] = None,
+                                 batch: Optional[DocumentBatch] = None) -> None:
         """
         处理事件摘要并保存元数据
 
@@ -279,6 +343,7 @@ class EventProcessor:
             file_name: 文件名
             user_db_path: 用户数据库路径
             user_id: 用户ID
+            batch: 文档的写入批次，为空时立即保存
         """
         try:
             # 提取事件摘要中的关键信息
@@ -310,7 +375,14 @@ class EventProcessor:
             }
            
             print(f'保存元数据: {metadata}')
-            await save_metadata_emb(metadata=metadata, saving_dir=title, user_db_path=user_db_path)
+            if batch is not None:
+                batch.add_table("detail_table", await build_metadata_table(metadata, title))
+                batch.add_timeline_entry(event=title, title=file_name, time=time, summary=summary)
+            else:
+                # 快照要在写入 detail_table 之前生成，事件才会作为新条目加入
+                await load_timeline_snapshot(user_db_path)
+                await save_metadata_emb(metadata=metadata, saving_dir=title, user_db_path=user_db_path)
+                await update_timeline_snapshot(user_db_path, event=title, title=file_name, time=time, summary=summary)
             
         except Exception as e:
             print(f"处理事件摘要并保存元数据时出错: {e}")
@@ -318,7 +390,8 @@ class EventProcessor:
                 self._update_status(user_id, "错误")
             raise e
 
-    async def process_relations(self, text: str, events: List[str], file_name: str) -> List[Dict]:
+    async def process_relations(self, text: str, events: List[str], file_name: str,
+                                user_db_path: Optional[str] = None) -> List[Dict]:
         """
         处理事件之间的关系
 
@@ -326,11 +399,14 @@ class EventProcessor:
             text: 文本内容
             events: 事件列表
             file_name: 文件名
+            user_db_path: 用户数据库路径，用于限制该用户的并发请求
 
         Returns:
             List[Dict]: 事件关系列表
         """
-        relations = self.processor.generate_response(
+        relations = await run_llm(
+            user_db_path,
+            self.processor.generate_response,
             "relations", 
             text, 
             output_format='json',
@@ -0,0 +1,146 @@
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from utils.db_writer import append_rows, run_exclusive
+from utils.db_pool import open_table, invalidate_table
+from utils.index_manager import schedule_index_check, wait_for_index_build
+from utils.event_index import remove_reserved_events, confirm_reserved_events
+from utils.relation_graph import add_relations
+from core.save_to_db.save_metadata import (ensure_detail_table, ensure_unique_relations, upsert_relations,
+                                           upsert_detail_rows, unique_relations)
+from core.save_to_db.timeline_snapshot import prepare_timeline_snapshot, apply_timeline_updates
+
+# 写入的表按这个顺序提交，detail_table 按 (event, title) 合并写入，其余追加
+BATCH_TABLES = ["article_segment_emb_table", "event_table", "detail_table"]
+
+
+class DocumentBatch:
+    """
+    一篇文档入库时产生的全部写入
+
+    处理过程中只收集各表的数据、关系和时间线条目，文档处理完后在写入队列中一次独占提交，
+    每张表一次写入。任何一步失败时把本次写过的表恢复到提交前的版本，
+    文档不会留下写了一半的数据，去重索引中只移除本文档预留的事件。
+    索引检查在整批提交成功后才启动，不会与回滚同时写同一张表。
+    """
+
+    def __init__(self, user_db_path: str):
+        self.user_db_path = user_db_path
+        # 表名 -> 待追加的 Arrow 表
+        self.tables: Dict[str, List[pa.Table]] = {}
+        self.relations: List[Dict[str, Any]] = []
+        self.timeline_updates: List[Dict[str, str]] = []
+        # 检查事件时在去重索引中预留的 (年份, 事件名称)
+        self.reserved_events: List[Tuple[str, str]] = []
+
+    def add_table(self, table_name: str, data: pa.Table) -> None:
+        """收集要追加到数据表的行"""
+        if data.num_rows:
+            self.tables.setdefault(table_name, []).append(data)
+
+    def add_relations(self, relations: List[Dict[str, Any]]) -> None:
+        """收集事件关系，提交时按事件对合并写入"""
+        self.relations.extend(relations)
+
+    def reserve_events(self, reserved: List[Tuple[str, str]]) -> None:
+        """记录检查事件时在去重索引中预留的新事件，提交失败或丢弃时只移除这些"""
+        self.reserved_events.extend(reserved)
+
+    def add_timeline_entry(self, event: str, title: str, time: str, summary: str) -> None:
+        """收集入库事件的时间线条目，提交时一次更新快照"""
+        self.timeline_updates.append({"event": event, "title": title, "time": time, "summary": summary})
+
+    def extend(self, other: "DocumentBatch") -> None:
+        """并入另一个批次收集的写入，用于按原顺序合并并发处理的各事件"""
+        for table_name, tables in other.tables.items():
+            self.tables.setdefault(table_name, []).extend(tables)
+        self.relations.extend(other.relations)
+        self.timeline_updates.extend(other.timeline_updates)
+        self.reserved_events.extend(other.reserved_events)
+
+    async def _table_versions(self, db, table_names: List[str]) -> Dict[str, Optional[int]]:
+        """提交前各表的版本，表不存在时为 None"""
+        versions = {}
+        for table_name in table_names:
+            tbl = await open_table(db.uri, table_name)
+            versions[table_name] = await tbl.version() if tbl is not None else None
+        return versions
+
+    async def _rollback(self, db, versions: Dict[str, Optional[int]]) -> None:
+        """把写过的表恢复到提交前的版本，本次新建的表直接删除"""
+        for table_name, version in versions.items():
+            # 迁移等步骤启动的索引构建可能还在写这张表，等它结束后再删除或恢复
+            await wait_for_index_build(db.uri, table_name)
+            try:
+                if version is None:
+                    if table_name in await db.table_names():
+                        await db.drop_table(table_name)
+                else:
+                    # 用单独的句柄切换版本，不影响连接池中的句柄
+                    tbl = await db.open_table(table_name)
+                    if await tbl.version() != version:
+                        await tbl.checkout(version)
+                        await tbl.restore()
+            except Exception as e:
+                print(f"回滚 {table_name} 时出错: {e}", self.user_db_path)
+            invalidate_table(db.uri, table_name)
+
+    async def commit(self) -> int:
+        """
+        在写入队列中独占提交本文档的全部写入
+
+        Returns:
+            int: 更新后的时间线快照版本
+        """
+        relations_list = unique_relations(self.relations)
+
+        async def commit(db):
+            try:
+                # 旧数据的一次性迁移和去重在记录版本之前完成，回滚时不会撤销
+                await ensure_detail_table(db)
+                await ensure_unique_relations(db)
+                # 首次入库的用户先按写入前的数据生成快照，本文档的事件作为新条目加入
+                await prepare_timeline_snapshot(db, self.user_db_path)
+
+                table_names = [table_name for table_name in BATCH_TABLES if table_name in self.tables]
+                if relations_list:
+                    table_names.append("relations_table")
+                versions = await self._table_versions(db, table_names)
+
+                try:
+                    for table_name in [table_name for table_name in BATCH_TABLES if table_name in self.tables]:
+                        data = pa.concat_tables(self.tables[table_name])
+                        if table_name == "detail_table":
+                            await upsert_detail_rows(db, data, check_index=False)
+                        else:
+                            await append_rows(db, table_name, data, check_index=False)
+                    if relations_list:
+                        await upsert_relations(db, relations_list, check_index=False)
+                    version = await apply_timeline_updates(db, self.user_db_path, self.timeline_updates)
+                except Exception:
+                    await self._rollback(db, versions)
+                    raise
+            except Exception:
+                # 在写入队列中移除，之后的检查不会再匹配到没有写入的事件
+                remove_reserved_events(self.user_db_path, self.reserved_events)
+                raise
+
+            confirm_reserved_events(self.user_db_path, self.reserved_events)
+            for table_name in table_names:
+                schedule_index_check(db, table_name)
+            add_relations(self.user_db_path, relations_list)
+            return version
+
+        return await run_exclusive(self.user_db_path, commit)
+
+    def discard(self) -> None:
+        """文档处理失败时丢弃收集的数据，从去重索引中移除本文档预留的事件，其他文档预留的不受影响"""
+        remove_reserved_events(self.user_db_path, self.reserved_events)
+        self.tables.clear()
+        self.relations.clear()
+        self.timeline_updates.clear()
+        self.reserved_events.clear()
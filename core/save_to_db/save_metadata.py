@@ -1,68 +1,224 @@
 import asyncio
 import os
 import json
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from utils.get_emb import get_emb
+from utils.get_emb import aget_emb_batch
+from utils.db_writer import run_exclusive
+from utils.index_manager import schedule_index_check
+from utils.relation_graph import add_relations
+from utils.db_pool import open_table, invalidate_table
+from utils.time_normalizer import normalize_time
+from utils.table_schemas import EMBEDDED_FIELDS, vector_column, make_table, rows_to_table
 import lancedb
-
-
-def extract_metadata_fields(metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Extract required fields from metadata.json"""
-    texts = []
-    for title,event_data in metadata.items():
-        fields = ['character_thought', 'author_view', 'summary', 'time']
-        for field in fields:
-            if field in event_data and event_data[field]:
-                texts.append({'title': title,'field': field, 'text': event_data[field]})
-    return texts
-
-async def save_relations(relations: List[Dict[str, Any]], user_db_path: str):
-    relations_list = []
+import pyarrow as pa
+
+# 已经确认 detail_table 为每个事件一行的数据库
+_migrated_dbs = set()
+# 已经去除重复关系的数据库
+_deduped_relation_dbs = set()
+
+
+def _figure_list(people: Any) -> Optional[List[str]]:
+    """人物字段统一为字符串列表"""
+    if not people:
+        return None
+    if isinstance(people, str):
+        return [people]
+    return [str(person) for person in people]
+
+
+async def migrate_detail_table(db) -> None:
+    """
+    把旧的 detail_table（每个字段一行，字段名在 field 列，文本在 text 列）转换为每个事件一行
+
+    同一事件同一来源文件的各字段合并到一行，语义字段沿用原来的向量，time 行的向量丢弃，
+    起止年份按 time 字段重新计算。一次读出整表后整表重写，索引由后台索引检查重建。
+    """
+    tbl = await open_table(db.uri, "detail_table")
+    if tbl is None:
+        return
+    if "field" not in (await tbl.schema()).names:
+        return
+
+    print("把 detail_table 转换为每个事件一行")
+    data = await tbl.query().select(["event", "title", "field", "text", "vector"]).to_arrow()
+
+    rows: Dict[tuple, Dict[str, Any]] = {}
+    columns = [data.column(name).to_pylist() for name in ["event", "title", "field", "text", "vector"]]
+    for event, title, field, text, vector in zip(*columns):
+        row = rows.setdefault((event, title), {'event': event, 'title': title})
+        # 同一字段重复时保留第一条，与时间线快照一致
+        if field not in row and (field in EMBEDDED_FIELDS or field == 'time'):
+            row[field] = text
+            if field in EMBEDDED_FIELDS:
+                row[vector_column(field)] = vector
+
+    for row in rows.values():
+        row['start_year'], row['end_year'] = normalize_time(row.get('time'))
+
+    await db.create_table("detail_table", data=rows_to_table("detail_table", list(rows.values())), mode="overwrite")
+    invalidate_table(db.uri, "detail_table")
+    schedule_index_check(db, "detail_table")
+
+
+async def dedup_relations(db) -> None:
+    """旧版本的 relations_table 可能有重复的事件对，保留每对最后一条后整表重写"""
+    tbl = await open_table(db.uri, "relations_table")
+    if tbl is None:
+        return
+    data = await tbl.query().select(["event_1", "event_2", "relation"]).to_arrow()
+
+    unique = {}
+    for row in data.to_pylist():
+        unique[(row['event_1'], row['event_2'])] = row
+    if len(unique) == data.num_rows:
+        return
+
+    print(f"relations_table 去除 {data.num_rows - len(unique)} 条重复关系")
+    await db.create_table("relations_table", data=rows_to_table("relations_table", list(unique.values())),
+                          mode="overwrite")
+    invalidate_table(db.uri, "relations_table")
+    schedule_index_check(db, "relations_table")
+
+
+def unique_relations(relations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """同一事件对只保留最后一条关系"""
+    unique = {}
     for relation_dict in relations:
         event_1 = relation_dict['event_1']
         event_2 = relation_dict['event_2']
         relation = relation_dict['relation']
-        relations_list.append({'event_1': event_1, 'event_2': event_2, 'relation': relation})
+        unique[(event_1, event_2)] = {'event_1': event_1, 'event_2': event_2, 'relation': relation}
+    return list(unique.values())
 
-    db = await lancedb.connect_async(user_db_path)
-    if "relations_table" not in await db.table_names():
-        await db.create_table("relations_table", data=relations_list)
-        tbl = await db.open_table("relations_table")
-        await tbl.add(relations_list)
-        
-    else:
-        tbl = await db.open_table("relations_table")
-        result = await tbl.query().where('event_1 = "{}" and event_2 = "{}"'.format(event_1, event_2)).limit(1).to_pandas()
-        if result.empty:
-            
-            await tbl.add(relations_list)
-        else:
-            print("关系已存在")
 
+async def ensure_unique_relations(db) -> None:
+    """旧的 relations_table 每个数据库只去重一次，只在写入队列的独占操作中调用"""
+    db_key = os.path.abspath(db.uri)
+    if db_key not in _deduped_relation_dbs:
+        await dedup_relations(db)
+        _deduped_relation_dbs.add(db_key)
+
+
+async def upsert_relations(db, relations_list: List[Dict[str, Any]], check_index: bool = True) -> None:
+    """按事件对合并写入关系，只在写入队列的独占操作中调用，check_index 为 False 时由调用方之后检查索引"""
+    data = rows_to_table("relations_table", relations_list)
+    await ensure_unique_relations(db)
+    tbl = await open_table(db.uri, "relations_table")
+    if tbl is None:
+        await db.create_table("relations_table", data=data)
+    else:
+        # 按事件对合并：已有的更新关系说明，新的插入，一次写入
+        await (tbl.merge_insert(["event_1", "event_2"])
+               .when_matched_update_all()
+               .when_not_matched_insert_all()
+               .execute(data))
+    if check_index:
+        schedule_index_check(db, "relations_table")
 
-async def save_metadata_emb(metadata: Dict[str, Any], saving_dir, user_db_path: str):
-    texts_with_vectors = []
 
-    db = await lancedb.connect_async(user_db_path)
-    
-    texts = extract_metadata_fields(metadata)
+async def save_relations(relations: List[Dict[str, Any]], user_db_path: str):
+    relations_list = unique_relations(relations)
+    if not relations_list:
+        return
+
+    async def upsert(db):
+        await upsert_relations(db, relations_list)
+        add_relations(user_db_path, relations_list)
+
+    # 合并写入需要与同一数据库的其他写操作串行
+    await run_exclusive(user_db_path, upsert)
+
+
+async def ensure_detail_table(db) -> None:
+    """旧的 detail_table 每个数据库只迁移一次，只在写入队列的独占操作中调用"""
+    db_key = os.path.abspath(db.uri)
+    if db_key not in _migrated_dbs:
+        await migrate_detail_table(db)
+        _migrated_dbs.add(db_key)
+
+
+async def prepare_detail_table(user_db_path: str) -> None:
+    """读取 detail_table 之前确认已经迁移到每个事件一行，每个数据库只需要一次"""
+    if os.path.abspath(user_db_path) not in _migrated_dbs:
+        await run_exclusive(user_db_path, ensure_detail_table)
+
+
+async def build_metadata_table(metadata: Dict[str, Any], saving_dir: str) -> pa.Table:
+    """
+    构建 detail_table 的写入数据，每个来源文件一行
+
+    只为 summary、character_thought、author_view 计算向量，时间和人物作为普通列保存。
+
+    Args:
+        metadata: 来源文件名 -> 事件的各字段
+        saving_dir: 事件名称
+
+    Returns:
+        pa.Table: detail_table 的行
+    """
+    titles = list(metadata)
+    texts = [(title, field, metadata[title][field])
+             for title in titles for field in EMBEDDED_FIELDS if metadata[title].get(field)]
+    emb_list = await aget_emb_batch([text for _, _, text in texts])
+    embs = {(title, field): emb for (title, field, _), emb in zip(texts, emb_list)}
+
+    years = [normalize_time(metadata[title].get('time')) for title in titles]
+    columns = {
+        'event': [saving_dir] * len(titles),
+        'title': titles,
+        'time': [metadata[title].get('time') or None for title in titles],
+        'figure': [_figure_list(metadata[title].get('figure')) for title in titles],
+        'start_year': [year[0] for year in years],
+        'end_year': [year[1] for year in years],
+    }
+    for field in EMBEDDED_FIELDS:
+        columns[field] = [metadata[title].get(field) or None for title in titles]
+        columns[vector_column(field)] = [embs.get((title, field)) for title in titles]
+
+    # 按列构建 Arrow 数据，不再逐行生成字典
+    return make_table("detail_table", columns)
+
+
+async def upsert_detail_rows(db, data: pa.Table, check_index: bool = True) -> None:
+    """
+    按 (event, title) 合并写入 detail_table，同一事件同一来源文件只保留一行，只在写入队列的独占操作中调用
+
+    重复上传同一文档时用新的内容更新已有行。
+
+    Args:
+        db: 数据库连接
+        data: build_metadata_table 构建的行
+        check_index: 是否在写入后检查索引，为 False 时由调用方之后检查
+    """
+    # 同一批数据中重复的 (event, title) 保留第一行
+    keys = zip(data.column("event").to_pylist(), data.column("title").to_pylist())
+    first_rows = list({key: i for i, key in reversed(list(enumerate(keys)))}.values())
+    if len(first_rows) < data.num_rows:
+        data = data.take(sorted(first_rows))
+
+    await ensure_detail_table(db)
+    tbl = await open_table(db.uri, "detail_table")
+    if tbl is None:
+        await db.create_table("detail_table", data=data)
+    else:
+        await (tbl.merge_insert(["event", "title"])
+               .when_matched_update_all()
+               .when_not_matched_insert_all()
+               .execute(data))
+    if check_index:
+        schedule_index_check(db, "detail_table")
 
-    for text in texts:
 
-        text_with_vector = text.copy()
-        text_with_vector['vector'] = get_emb(text['text'])
-        text_with_vector['event'] = saving_dir
-        texts_with_vectors.append(text_with_vector)
+async def save_metadata_emb(metadata: Dict[str, Any], saving_dir, user_db_path: str):
+    data = await build_metadata_table(metadata, saving_dir)
 
+    async def upsert(db):
+        await upsert_detail_rows(db, data)
 
-    if "detail_table" not in await db.table_names():
-        await db.create_table("detail_table", data=texts_with_vectors)
-    else:
-        tbl = await db.open_table("detail_table")
-                       
-        await tbl.add(texts_with_vectors)
+    await run_exclusive(user_db_path, upsert)
 
 
 if __name__ == "__main__":
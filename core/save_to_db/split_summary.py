@@ -7,7 +7,9 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from utils.general_utils import generate_id_from_chinese
-from utils.get_emb import get_emb
+from utils.get_emb import aget_emb_batch
+from utils.db_writer import write_rows
+from utils.table_schemas import make_table
 import lancedb
 
 
@@ -83,7 +85,7 @@ def split_documents(text):
 
 
     
-async def store_embedding(emb_list, id_list, summary_list, chunk_list, doc_title, uri: str):
+async def store_embedding(emb_list, id_list, summary_list, chunk_list, doc_title, uri: str, batch=None):
     print(f"store_embedding called with {len(emb_list)} embeddings for doc: {doc_title}")
     
     # 确保使用绝对路径
@@ -93,68 +95,41 @@ async def store_embedding(emb_list, id_list, summary_list, chunk_list, doc_title
         uri = os.path.join(current_dir, uri)
         print(f"Converting to absolute path: {uri}")
     
-    data_list = []
-    for i in range(len(id_list)):
-        data_list.append({"vector": emb_list[i], "item": id_list[i], "summary": summary_list[i], "chunk": chunk_list[i], "doc_title": doc_title, "flag": 1})
-        
+    data = make_table("article_segment_emb_table", {
+        "vector": emb_list,
+        "item": id_list,
+        "summary": summary_list,
+        "chunk": chunk_list,
+        "doc_title": [doc_title] * len(id_list),
+        "flag": [1] * len(id_list),
+    })
+
+    # 属于文档的写入批次时随文档一起提交
+    if batch is not None:
+        batch.add_table("article_segment_emb_table", data)
+        return
+
+    # 写入经过用户数据库的写入队列，与其他表的写操作串行
     try:
-        db = await lancedb.connect_async(uri)
-        print(f"Connected to database successfully")
-    except Exception as conn_err:
-        print(f"Database connection error: {str(conn_err)}")
-        print(f"Error type: {type(conn_err).__name__}")
+        print(f"Adding {data.num_rows} records to article_segment_emb_table")
+        await write_rows(uri, "article_segment_emb_table", data)
+        print("Records added successfully")
+    except Exception as add_err:
+        print(f"Error adding records: {str(add_err)}")
+        print(f"Error type: {type(add_err).__name__}")
+        print(f"Data schema: {data.schema}")
         raise
-        
-    # 其余代码保持不变
-    print(f"Getting table names")
-    try:
-        table_names = await db.table_names()
-        print(f"Connected to database. Tables: {table_names}")
-    except Exception as table_err:
-        print(f"Error getting table names: {str(table_err)}")
-        print(f"Error type: {type(table_err).__name__}")
-        raise
-
-    if "article_segment_emb_table" not in table_names:
-        print("Creating new table: article_segment_emb_table")
-        try:
-            await db.create_table("article_segment_emb_table", data=data_list)
-            print("Table created successfully")
-        except Exception as create_err:
-            print(f"Error creating table: {str(create_err)}")
-            print(f"Error type: {type(create_err).__name__}")
-            print(f"First data item structure: {data_list[0].keys() if data_list else 'No data'}")
-            raise
-    else:
-        print("Opening existing table: article_segment_emb_table")
-        try:
-            tbl = await db.open_table("article_segment_emb_table")
-            print(f"Adding {len(data_list)} records to existing table")
-            await tbl.add(data_list)
-            print("Records added successfully")
-        except Exception as add_err:
-            print(f"Error adding records: {str(add_err)}")
-            print(f"Error type: {type(add_err).__name__}")
-            raise
    
 
-async def process_summary(text: str, doc_name: str, uri: str):
+async def process_summary(text: str, doc_name: str, uri: str, batch=None):
     splits = split_documents(text)
     summaries, chunks = process_chunks(splits)
 
 
-    emb_list = []
-    id_list = []
+    emb_list = await aget_emb_batch(chunks)
+    id_list = [generate_id_from_chinese(chunk) for chunk in chunks]
 
-    for i in range(len(chunks)):
-            chunk_id = generate_id_from_chinese(chunks[i])
-            chunk = chunks[i]
-            
-            emb = get_emb(chunk)
-            emb_list.append(emb)
-            id_list.append(chunk_id)
-            
-    await store_embedding(emb_list, id_list, summaries, chunks, doc_name, uri)
+    await store_embedding(emb_list, id_list, summaries, chunks, doc_name, uri, batch)
     
 
     
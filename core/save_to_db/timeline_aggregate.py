@@ -0,0 +1,141 @@
+import os
+import sys
+import bisect
+import heapq
+from typing import Any, Dict, List, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from core.save_to_db.timeline_snapshot import load_timeline_snapshot, snapshot_path
+from utils.relation_graph import get_relation_graph
+from utils.user_cache import UserCache
+
+
+# 朝代的起始年份，某年属于起始年份不晚于它的最后一个朝代
+DYNASTIES: List[Tuple[int, str]] = [
+    (-2070, "夏"), (-1600, "商"), (-1046, "西周"), (-770, "春秋"), (-475, "战国"),
+    (-221, "秦"), (-206, "西汉"), (9, "新"), (25, "东汉"), (220, "三国"),
+    (266, "西晋"), (317, "东晋"), (420, "南北朝"), (581, "隋"), (618, "唐"),
+    (907, "五代十国"), (960, "北宋"), (1127, "南宋"), (1279, "元"), (1368, "明"),
+    (1644, "清"), (1912, "中华民国"), (1949, "中华人民共和国"),
+]
+DYNASTY_STARTS = [start for start, _ in DYNASTIES]
+
+ZOOM_LEVELS = ("decade", "century", "dynasty")
+
+# 快照文件路径 -> (快照版本, {(level, top_n): 聚合结果})，长时间未使用或超过用户数上限时淘汰
+_bucket_cache = UserCache()
+
+
+def _bc(year: int) -> str:
+    return f"公元前{-year}年" if year < 0 else f"{year}年"
+
+
+def bucket_of(year: int, level: str) -> Tuple[int, int, str]:
+    """
+    计算年份所在的分组
+
+    Args:
+        year: 年份，公元前用负数表示
+        level: decade、century 或 dynasty
+
+    Returns:
+        Tuple[int, int, str]: 分组的起始年份、结束年份和名称
+    """
+    if level == "decade":
+        start = year // 10 * 10
+        label = f"{start}年代" if start >= 0 else f"{_bc(start)}-{_bc(start + 9)}"
+        return start, start + 9, label
+
+    if level == "century":
+        # 与时间解析一致：公元 N 世纪为 (N-1)*100+1 至 N*100 年
+        if year > 0:
+            century = (year - 1) // 100 + 1
+            return (century - 1) * 100 + 1, century * 100, f"{century}世纪"
+        century = (-year - 1) // 100 + 1
+        return -century * 100, -(century - 1) * 100 - 1, f"公元前{century}世纪"
+
+    position = bisect.bisect_right(DYNASTY_STARTS, year) - 1
+    if position < 0:
+        return -sys.maxsize, DYNASTY_STARTS[0] - 1, "史前"
+    end = DYNASTY_STARTS[position + 1] - 1 if position + 1 < len(DYNASTIES) else sys.maxsize
+    return DYNASTY_STARTS[position], end, DYNASTIES[position][1]
+
+
+def aggregate_timeline(timeline: List[Dict[str, Any]], level: str, top_n: int,
+                       degrees: Dict[str, int]) -> Dict[str, Any]:
+    """
+    按缩放级别把时间线条目分组
+
+    条目按起始年份归入分组，每组按重要度（来源文件数 + 关联事件数）保留前 top_n 个代表事件。
+
+    Args:
+        timeline: 按时间排序的快照条目
+        level: decade、century 或 dynasty
+        top_n: 每组保留的代表事件数
+        degrees: 事件 -> 关联事件数
+
+    Returns:
+        Dict[str, Any]: buckets 分组列表和无法解析年份的条目数 undated
+    """
+    buckets: Dict[int, Dict[str, Any]] = {}
+    candidates: Dict[int, List[Tuple[int, int, Dict[str, Any]]]] = {}
+    undated = 0
+
+    for position, entry in enumerate(timeline):
+        if entry.get("start_year") is None:
+            undated += 1
+            continue
+        start, end, label = bucket_of(entry["start_year"], level)
+        bucket = buckets.get(start)
+        if bucket is None:
+            bucket = {"label": label, "start_year": start, "end_year": end, "count": 0}
+            buckets[start] = bucket
+        bucket["count"] += 1
+
+        importance = len(entry.get("sources") or [entry["title"]]) + degrees.get(entry["file"], 0)
+        # 重要度相同时保持时间顺序
+        candidates.setdefault(start, []).append((-importance, position, entry))
+
+    result = []
+    for start in sorted(buckets):
+        bucket = buckets[start]
+        top = heapq.nsmallest(top_n, candidates[start], key=lambda x: (x[0], x[1]))
+        bucket["events"] = [dict(entry, importance=-score) for score, _, entry in top]
+        result.append(bucket)
+
+    return {"buckets": result, "undated": undated}
+
+
+async def get_timeline_buckets(user_db_path: str, level: str, top_n: int) -> Dict[str, Any]:
+    """
+    获取时间线的缩放聚合结果，同一快照版本内复用
+
+    Args:
+        user_db_path: 用户数据库路径
+        level: decade、century 或 dynasty
+        top_n: 每组保留的代表事件数
+
+    Returns:
+        Dict[str, Any]: version、level、buckets 和 undated
+    """
+    if level not in ZOOM_LEVELS:
+        raise ValueError(f"不支持的缩放级别: {level}")
+
+    snapshot = await load_timeline_snapshot(user_db_path)
+    version = snapshot["version"]
+    path = snapshot_path(user_db_path)
+    key = (level, top_n)
+
+    cached = _bucket_cache.get(path)
+    if cached and cached[0] == version and key in cached[1]:
+        return cached[1][key]
+
+    degrees = (await get_relation_graph(user_db_path)).degrees()
+    result = {"version": version, "level": level, **aggregate_timeline(snapshot["timeline"], level, top_n, degrees)}
+
+    cached = _bucket_cache.get(path)
+    if not cached or cached[0] != version:
+        cached = (version, {})
+        _bucket_cache.put(path, cached)
+    cached[1][key] = result
+    return result
@@ -0,0 +1,403 @@
+import os
+import sys
+import json
+import base64
+import bisect
+import heapq
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from utils.db_writer import run_exclusive
+from utils.db_pool import open_table
+from utils.user_cache import UserCache
+from utils.time_normalizer import normalize_time
+from core.save_to_db.save_metadata import ensure_detail_table
+
+
+SNAPSHOT_FILE_NAME = "timeline_snapshot.json"
+# 快照条目格式的版本，旧格式的快照读取时补齐年份字段
+SNAPSHOT_FORMAT = 4
+
+# 快照文件路径 -> (修改时间, 快照内容)，文件未变化时直接复用，
+# 长时间未使用或超过用户数上限时淘汰，下次读取时重新加载文件
+_snapshot_cache = UserCache()
+
+
+def snapshot_path(user_db_path: str) -> str:
+    """时间线快照文件与用户的 lancedb 目录放在同一个用户目录下"""
+    return os.path.join(os.path.dirname(os.path.abspath(user_db_path)), SNAPSHOT_FILE_NAME)
+
+
+def _make_entry(event: str, title: str, time: str, summary: str,
+                created_version: int = 0, updated_version: int = 0,
+                sources: Optional[List[str]] = None) -> Dict[str, Any]:
+    # 大模型给出的时间可能为 null，统一存为空字符串，排序时不会与字符串比较出错
+    time = time or ""
+    start_year, end_year = normalize_time(time)
+    return {
+        "title": title,
+        "time": time,
+        "event": summary,
+        "file": event,
+        "dir": time,
+        # 提到该事件的全部来源文件
+        "sources": sources if sources is not None else [title],
+        "start_year": start_year,
+        "end_year": end_year,
+        # 按起始年份排序，无法解析的排在最后
+        "sort_key": start_year if start_year is not None else sys.maxsize,
+        # 条目首次出现和最近一次变化时的快照版本，用于增量同步
+        "created_version": created_version,
+        "updated_version": updated_version,
+    }
+
+
+def _entry_order(entry: Dict[str, Any]) -> Tuple:
+    """时间线的排序键，最后用事件名保证唯一，分页游标据此定位"""
+    return (entry['sort_key'], entry.get('end_year') or 0, entry['time'] or "", entry['file'])
+
+
+def _sort_timeline(entries: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return sorted(entries.values(), key=_entry_order)
+
+
+def _assign_lanes(timeline: List[Dict[str, Any]], version: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    为时间线条目分配显示的行号 lane
+
+    每个条目占用 [start_year, end_year + 1) 的区间，按起始年份依次放入编号最小的空闲行，
+    同一行的条目互不重叠，行数等于同一时刻重叠条目数的最大值。无法解析年份的条目 lane 为 None。
+
+    Args:
+        timeline: 按时间排序的条目
+        version: 传入时，行号发生变化的条目更新 updated_version，增量同步会带上它们
+
+    Returns:
+        List[Dict[str, Any]]: 分配行号后的条目，行号变化的条目是新的字典，不修改原条目
+    """
+    busy: List[Tuple[int, int]] = []  # (占用结束年份, 行号)
+    free: List[int] = []
+    lane_count = 0
+    result = []
+
+    for entry in timeline:
+        lane = None
+        if entry.get('start_year') is not None:
+            while busy and busy[0][0] <= entry['start_year']:
+                heapq.heappush(free, heapq.heappop(busy)[1])
+            if free:
+                lane = heapq.heappop(free)
+            else:
+                lane = lane_count
+                lane_count += 1
+            heapq.heappush(busy, (entry['end_year'] + 1, lane))
+
+        if 'lane' not in entry or entry['lane'] != lane:
+            entry = dict(entry, lane=lane)
+            if version is not None:
+                entry['updated_version'] = version
+        result.append(entry)
+    return result
+
+
+def _upgrade_snapshot(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """旧格式的快照按时间文本重新计算年份和排序，保留各条目的版本号"""
+    if snapshot.get("format") == SNAPSHOT_FORMAT:
+        return snapshot
+    entries = {}
+    for entry in snapshot["timeline"]:
+        entries[entry["file"]] = _make_entry(entry["file"], entry["title"], entry["time"], entry["event"],
+                                             entry.get("created_version", 0), entry.get("updated_version", 0),
+                                             entry.get("sources"))
+    return {"format": SNAPSHOT_FORMAT, "version": snapshot["version"], "timeline": _assign_lanes(_sort_timeline(entries))}
+
+
+async def build_timeline_snapshot(db) -> Dict[str, Any]:
+    """
+    从 detail_table 全量生成时间线快照，用于还没有快照文件的用户
+
+    Args:
+        db: 用户数据库连接
+
+    Returns:
+        Dict[str, Any]: 快照内容
+    """
+    entries: Dict[str, Dict[str, Any]] = {}
+    await ensure_detail_table(db)
+    tbl = await open_table(db.uri, "detail_table")
+    if tbl is not None:
+        result = await tbl.query().select(["event", "title", "time", "summary"]).to_arrow()
+
+        summary_by_event = {}
+        time_by_event = {}
+        sources_by_event = {}
+        columns = [result.column(name).to_pylist() for name in ["event", "title", "time", "summary"]]
+        for event, title, time, summary in zip(*columns):
+            if summary:
+                summary_by_event.setdefault(event, (title, summary))
+                sources = sources_by_event.setdefault(event, [])
+                if title not in sources:
+                    sources.append(title)
+            if time:
+                time_by_event.setdefault(event, time)
+
+        for event, (title, summary) in summary_by_event.items():
+            entries[event] = _make_entry(event, title, time_by_event.get(event, ""), summary,
+                                         sources=sources_by_event[event])
+
+    return {"format": SNAPSHOT_FORMAT, "version": 0, "timeline": _assign_lanes(_sort_timeline(entries))}
+
+
+def _read_snapshot_file(path: str) -> Optional[Dict[str, Any]]:
+    """读取快照文件，文件未变化时使用内存中的副本"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    cached = _snapshot_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        snapshot = _upgrade_snapshot(json.load(f))
+
+    _snapshot_cache.put(path, (mtime, snapshot))
+    return snapshot
+
+
+def _write_snapshot_file(path: str, snapshot: Dict[str, Any]) -> None:
+    """先写临时文件再替换，读取方不会读到写了一半的快照"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+    _snapshot_cache.put(path, (os.stat(path).st_mtime_ns, snapshot))
+
+
+async def _load_or_build(db, path: str) -> Dict[str, Any]:
+    snapshot = _read_snapshot_file(path)
+    if snapshot is None:
+        snapshot = await build_timeline_snapshot(db)
+        _write_snapshot_file(path, snapshot)
+    return snapshot
+
+
+async def load_timeline_snapshot(user_db_path: str) -> Dict[str, Any]:
+    """
+    读取用户的时间线快照，快照不存在时从 detail_table 生成
+
+    Args:
+        user_db_path: 用户数据库路径
+
+    Returns:
+        Dict[str, Any]: 包含 version 和按时间排序的 timeline
+    """
+    path = snapshot_path(user_db_path)
+    snapshot = _read_snapshot_file(path)
+    if snapshot is not None:
+        return snapshot
+
+    # 首次生成与写入串行，避免和正在进行的入库同时写快照
+    async def build(db):
+        return await _load_or_build(db, path)
+
+    return await run_exclusive(user_db_path, build)
+
+
+async def prepare_timeline_snapshot(db, user_db_path: str) -> None:
+    """
+    还没有快照文件时按写入前的 detail_table 生成，只在写入队列的独占操作中、写入数据表之前调用
+
+    快照在写入之后才生成时，本次写入的事件会成为版本 0 的条目，增量同步会把它们当作已有条目的变化。
+
+    Args:
+        db: 数据库连接
+        user_db_path: 用户数据库路径
+    """
+    await _load_or_build(db, snapshot_path(user_db_path))
+
+
+async def apply_timeline_updates(db, user_db_path: str, updates: List[Dict[str, str]]) -> int:
+    """
+    把一批入库的事件合并进时间线快照，整批只增加一个版本，只在写入队列的独占操作中调用
+
+    已有的事件保留最先写入的标题、时间和总结，与 detail_table 中的第一条记录一致，
+    新文档合并进已有事件时只更新该条目的版本，客户端据此刷新事件详情。
+
+    Args:
+        db: 数据库连接
+        user_db_path: 用户数据库路径
+        updates: 包含 event（事件名称）、title（来源文件名）、time、summary 的列表
+
+    Returns:
+        int: 更新后的快照版本
+    """
+    path = snapshot_path(user_db_path)
+    snapshot = await _load_or_build(db, path)
+    if not updates:
+        return snapshot["version"]
+
+    entries = {entry["file"]: entry for entry in snapshot["timeline"]}
+    version = snapshot["version"] + 1
+
+    for update in updates:
+        event, title, time, summary = update["event"], update["title"], update["time"], update["summary"]
+        entry = entries.get(event)
+        if entry is None:
+            entries[event] = _make_entry(event, title, time, summary, version, version)
+        else:
+            sources = list(entry.get("sources") or [entry["title"]])
+            if title not in sources:
+                sources.append(title)
+            # 已有条目缺少时间或总结时补全
+            entries[event] = _make_entry(event, entry["title"] or title, entry["time"] or time,
+                                         entry["event"] or summary,
+                                         entry.get("created_version", 0), version, sources)
+
+    new_snapshot = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        # 新条目可能让之后的条目换行，换行的条目也计入本版本的变化
+        "timeline": _assign_lanes(_sort_timeline(entries), version),
+    }
+    _write_snapshot_file(path, new_snapshot)
+    return version
+
+
+async def update_timeline_snapshot(user_db_path: str, event: str, title: str,
+                                   time: str, summary: str) -> int:
+    """
+    入库后增量更新时间线快照
+
+    Args:
+        user_db_path: 用户数据库路径
+        event: 事件名称
+        title: 来源文件名
+        time: 事件时间
+        summary: 事件总结
+
+    Returns:
+        int: 更新后的快照版本
+    """
+    updates = [{"event": event, "title": title, "time": time, "summary": summary}]
+
+    async def update(db):
+        return await apply_timeline_updates(db, user_db_path, updates)
+
+    return await run_exclusive(user_db_path, update)
+
+
+def get_timeline_changes(snapshot: Dict[str, Any], since: Optional[int]) -> Dict[str, Any]:
+    """
+    计算客户端已有版本之后的时间线变化
+
+    Args:
+        snapshot: 时间线快照
+        since: 客户端上次拿到的版本，为空或不合法时返回全量
+
+    Returns:
+        Dict[str, Any]: version、是否全量 full、新增的 added 和变化的 changed 条目
+    """
+    version = snapshot["version"]
+    if since is None or since < 0 or since > version:
+        return {"version": version, "full": True, "added": snapshot["timeline"], "changed": []}
+
+    added = []
+    changed = []
+    for entry in snapshot["timeline"]:
+        if entry.get("updated_version", 0) <= since:
+            continue
+        if entry.get("created_version", 0) > since:
+            added.append(entry)
+        else:
+            changed.append(entry)
+
+    return {"version": version, "full": False, "added": added, "changed": changed}
+
+
+class TimelineWindowIndex:
+    """
+    时间线快照的年份区间索引
+
+    条目已按起始年份排序，另外记录结束年份的前缀最大值，
+    查询与 [from_year, to_year] 相交的条目时两次二分定位扫描范围，
+    扫描量与窗口内的条目数成正比。
+    """
+
+    def __init__(self, timeline: List[Dict[str, Any]]):
+        self.timeline = timeline
+        self.orders = [_entry_order(entry) for entry in timeline]
+        # 能解析出年份的条目排在前面
+        self.dated_count = sum(1 for entry in timeline if entry.get('start_year') is not None)
+        self.starts = [entry['start_year'] for entry in timeline[:self.dated_count]]
+        self.max_ends = list(accumulate((entry['end_year'] for entry in timeline[:self.dated_count]), max))
+
+    def window(self, from_year: Optional[int], to_year: Optional[int], limit: int,
+               after: Optional[Tuple] = None) -> Tuple[List[Dict[str, Any]], Optional[Tuple]]:
+        """
+        按年份窗口分页取条目
+
+        Args:
+            from_year: 窗口起始年份，为空表示不限
+            to_year: 窗口结束年份，为空表示不限
+            limit: 本页最多返回的条目数
+            after: 上一页最后一个条目的排序键
+
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[Tuple]]: 本页条目，以及还有下一页时本页最后一个条目的排序键
+        """
+        windowed = from_year is not None or to_year is not None
+
+        # 结束年份早于 from_year 的前缀整体跳过
+        start = bisect.bisect_left(self.max_ends, from_year) if from_year is not None else 0
+        if to_year is not None:
+            end = bisect.bisect_right(self.starts, to_year)
+        else:
+            # 指定年份窗口时不返回无法解析年份的条目
+            end = self.dated_count if windowed else len(self.timeline)
+        if after is not None:
+            start = max(start, bisect.bisect_right(self.orders, after))
+
+        entries = []
+        for position in range(start, end):
+            entry = self.timeline[position]
+            if from_year is not None and entry['end_year'] < from_year:
+                continue
+            if len(entries) == limit:
+                return entries, _entry_order(entries[-1])
+            entries.append(entry)
+        return entries, None
+
+
+# 快照文件路径 -> (版本, 区间索引)，与快照一样按用户淘汰
+_window_indexes = UserCache()
+
+
+def get_window_index(user_db_path: str, snapshot: Dict[str, Any]) -> TimelineWindowIndex:
+    """获取快照对应的区间索引，快照版本不变时复用"""
+    path = snapshot_path(user_db_path)
+    cached = _window_indexes.get(path)
+    if cached and cached[0] == snapshot["version"]:
+        return cached[1]
+
+    index = TimelineWindowIndex(snapshot["timeline"])
+    _window_indexes.put(path, (snapshot["version"], index))
+    return index
+
+
+def encode_cursor(order: Tuple) -> str:
+    """分页游标为最后一个条目排序键的 base64 编码，快照更新后依然有效"""
+    return base64.urlsafe_b64encode(json.dumps(order, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple]:
+    """解析分页游标，不合法时抛出 ValueError"""
+    if not cursor:
+        return None
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode('ascii'))))
+    except Exception:
+        raise ValueError("无效的分页游标")
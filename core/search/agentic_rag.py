@@ -83,7 +83,7 @@ class AgenticRAG:
                         "properties": {
                             "time_list": {
                                 "type": "array",
-                                "description": "时间列表，例如['1927','1928']",
+                                "description": "时间列表，例如['1927','1928']，也可以是时间范围或年代，例如['1927-1937','1920年代']",
                                 "items": {
                                     "type": "string"
                                 }
@@ -0,0 +1,57 @@
+import os
+import sys
+from typing import Any, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from utils.db_pool import open_table
+from utils.relation_graph import get_relation_graph
+from utils.general_utils import sql_string
+from core.save_to_db.save_metadata import prepare_detail_table
+
+DETAIL_FIELDS = ['summary', 'character_thought', 'author_view', 'time']
+
+
+async def get_event_details(events: List[str], user_db_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    批量获取事件详情和相关事件
+
+    对 detail_table 执行一次只取文本列的查询，每个来源文件一行，相关事件取自内存中的关系图。
+
+    Args:
+        events: 事件名称列表
+        user_db_path: 用户数据库路径
+
+    Returns:
+        Dict[str, Dict[str, Any]]: 事件名称 -> {content_by_title, related_events}，不存在的事件不返回，
+        related_events 包含两个方向的关系
+    """
+    events = list(dict.fromkeys(event for event in events if event))
+    if not events:
+        return {}
+
+    await prepare_detail_table(user_db_path)
+    tbl = await open_table(user_db_path, "detail_table")
+    if tbl is None:
+        return {}
+
+    # 事件名称来自客户端，按字面量转义，含引号的名称不会让整批查询出错
+    event_condition = ", ".join(sql_string(event) for event in events)
+
+    result = await tbl.query().where(f"event IN ({event_condition})").select(["event", "title", *DETAIL_FIELDS]).to_arrow()
+
+    details: Dict[str, Dict[str, Any]] = {}
+    columns = {name: result.column(name).to_pylist() for name in ["event", "title", *DETAIL_FIELDS]}
+    for i, event in enumerate(columns["event"]):
+        detail = details.setdefault(event, {'content_by_title': {}, 'related_events': []})
+        # 按照title分组内容
+        content = detail['content_by_title'].setdefault(columns["title"][i] or '未命名', {})
+        for field in DETAIL_FIELDS:
+            if columns[field][i]:
+                content[field] = columns[field][i]
+
+    if details:
+        graph = await get_relation_graph(user_db_path)
+        for event, detail in details.items():
+            detail['related_events'] = graph.neighbours(event)
+
+    return details
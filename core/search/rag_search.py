@@ -7,11 +7,23 @@ from openai import OpenAI
 import lancedb
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from utils.get_emb import get_emb
+from utils.get_emb import aget_emb
+from utils.index_manager import configure_vector_query
+from utils.db_pool import get_db, open_table
+from utils.table_schemas import EMBEDDED_FIELDS, vector_column
+from core.save_to_db.save_metadata import prepare_detail_table
 from core.search.bm25_search import BM25
 
 from utils.constants import DASHSCOPE_API_KEY, DASHSCOPE_BASE_URL
 
+# detail_table 各语义字段在检索结果中的前缀
+FIELD_LABELS = {
+    'summary': "事件总结",
+    'character_thought': "事件人物的想法",
+    'author_view': "作者的观点",
+}
+
+
 class TimelineQuerySystem:
     def __init__(self,  api_key=DASHSCOPE_API_KEY):
         self.client = OpenAI(
@@ -41,13 +53,14 @@ class TimelineQuerySystem:
             return
         
         # Connect to LanceDB
-        self.db = await lancedb.connect_async(db_path)
+        self.db_path = db_path
+        self.db = await get_db(db_path)
 
     async def _load_text(self):
         """Load all text from the timeline data"""
     
 
-        tbl = await self.db.open_table("article_segment_emb_table")
+        tbl = await open_table(self.db_path, "article_segment_emb_table")
       
         result = await tbl.query().limit(1000).to_pandas()
         self.text_list = result['summary'].tolist()
@@ -55,25 +68,26 @@ class TimelineQuerySystem:
 
     async def find_similar_events(self, query, similarity_threshold=0.8, top_k=3):
         """Find similar events based on query embedding"""
-        query_emb = get_emb(query)
+        query_emb = await aget_emb(query)
       
-        tbl = await self.db.open_table("detail_table")
+        await prepare_detail_table(self.db_path)
+        tbl = await open_table(self.db_path, "detail_table")
 
-        result = await tbl.search(query_emb)
-        result_detail = await result.limit(top_k).to_pandas()
+        # 每个语义字段有自己的向量列，分别检索后按距离合并，取最接近的 top_k 条
+        async def search_field(field):
+            result = configure_vector_query(
+                await tbl.search(query_emb, vector_column_name=vector_column(field)), "detail_table")
+            result = await result.where(f"{field} IS NOT NULL").select([field]).limit(top_k).to_arrow()
+            return [(distance, field, text) for distance, text
+                    in zip(result.column("_distance").to_pylist(), result.column(field).to_pylist())]
 
-        detail_list = []
-        for index, row in result_detail.iterrows():
-            if row['field'] == 'summary':
-                detail_list.append(f"事件总结：{row['text']}")
-            elif row['field'] == 'character_thought':
-                detail_list.append(f"事件人物的想法：{row['text']}")
-            elif row['field'] == 'author_view':
-                detail_list.append(f"作者的观点：{row['text']}")
+        hits = [hit for hits in await asyncio.gather(*(search_field(field) for field in EMBEDDED_FIELDS))
+                for hit in hits]
+        detail_list = [f"{FIELD_LABELS[field]}：{text}" for _, field, text in sorted(hits)[:top_k]]
 
-        tbl2 = await self.db.open_table("article_segment_emb_table")
+        tbl2 = await open_table(self.db_path, "article_segment_emb_table")
 
-        result = await tbl2.search(query_emb)
+        result = configure_vector_query(await tbl2.search(query_emb), "article_segment_emb_table")
         result_summary = await result.limit(top_k).to_pandas()
 
         return detail_list + result_summary['summary'].tolist()
@@ -150,7 +164,7 @@ async def search_query(query, db_path):
 
 async def search_in_raw_data( query):
     """Search in raw data"""
-    query_emb = get_emb(query)
+    query_emb = await aget_emb(query)
     uri = "data/lancedb"
     db = lancedb.connect(uri)
     tbl = db.open_table("article_segment_emb_table")
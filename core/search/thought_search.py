@@ -5,7 +5,11 @@ import sys
 import json
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from utils.get_emb import get_emb
+from utils.get_emb import aget_emb
+from utils.index_manager import configure_vector_query
+from utils.db_pool import open_table
+from utils.table_schemas import vector_column
+from core.save_to_db.save_metadata import prepare_detail_table
 
 
 
@@ -29,21 +33,21 @@ async def search_character_thought(event_list: list[str] = [], character_list: l
     
     try:
         
-        db = await lancedb.connect_async(db_path)
-        
-      
-        if "detail_table" not in await db.table_names():
+        await prepare_detail_table(db_path)
+        tbl = await open_table(db_path, "detail_table")
+        if tbl is None:
             return json.dumps([], ensure_ascii=False)
-        
-        tbl = await db.open_table("detail_table")
 
         if event_list:
 
             for event in event_list:
-                result = await tbl.search(get_emb(event))
-                result = await result.limit(10).where("field='character_thought'").to_pandas()
+                result = configure_vector_query(
+                    await tbl.search(await aget_emb(event), vector_column_name=vector_column("character_thought")),
+                    "detail_table")
+                result = await result.limit(10).where("character_thought IS NOT NULL").select(
+                    ["event", "character_thought"]).to_pandas()
                 
-                thought_text_list = result['text'].tolist()
+                thought_text_list = result['character_thought'].tolist()
 
                 for text in thought_text_list:
                     for character in character_list:
@@ -51,13 +55,14 @@ async def search_character_thought(event_list: list[str] = [], character_list: l
                             res.append(text)
 
         else:
-            result = await tbl.query().limit(1000).where("field='character_thought'").to_pandas()
+            result = await tbl.query().limit(1000).where("character_thought IS NOT NULL").select(
+                ["event", "character_thought"]).to_pandas()
 
             
             for index, row in result.iterrows():
                 event_str = ''
                 event = row['event']
-                text = row['text']
+                text = row['character_thought']
 
                 for single_thought in text.split("；"):
                     for character in character_list:
@@ -3,13 +3,18 @@ import os
 import json
 import lancedb
 import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from utils.time_normalizer import normalize_time
+from utils.db_pool import open_table
+from utils.general_utils import sql_string
+from core.save_to_db.save_metadata import prepare_detail_table
 
 async def search_by_time(time_list: list[str], db_path: str) -> str:
     """
     按时间搜索事件
     
     Args:
-        time_list: 时间列表
+        time_list: 时间列表，支持 "1928"、"1927-1937"、"民国十七年"、"1920年代" 等写法
         user_id: 用户ID，如果为None则尝试从Flask上下文获取
         
     Returns:
@@ -23,41 +28,50 @@ async def search_by_time(time_list: list[str], db_path: str) -> str:
         return json.dumps([], ensure_ascii=False)
     
     try:
-        # 连接到LanceDB
-        db = await lancedb.connect_async(db_path)
-        
-        # 检查表是否存在
-        if "detail_table" not in await db.table_names():
+        await prepare_detail_table(db_path)
+        tbl = await open_table(db_path, "detail_table")
+        if tbl is None:
             return json.dumps([], ensure_ascii=False)
-        
-        # 打开表
-        tbl = await db.open_table("detail_table")
-        
-        # 构建查询条件
+
+        # 构建查询条件：能解析出年份的按年份范围相交查询，其余按时间文本匹配
         time_conditions = []
         for time in time_list:
-            time_conditions.append(f'text like "%{time}%"')
-        
+            start_year, end_year = normalize_time(time)
+            if start_year is not None:
+                time_conditions.append(f"(start_year <= {end_year} AND end_year >= {start_year})")
+            else:
+                time_conditions.append(f"(time like {sql_string(f'%{time}%')})")
+
         # 如果有时间条件，则执行查询
         if time_conditions:
             query_condition = " OR ".join(time_conditions)
 
-            query_condition += " AND field='time'"
+            # 每个事件一行，一次查询取出匹配事件的时间和总结
+            result = await tbl.query().where(query_condition).select(
+                ["event", "time", "summary", "start_year"]
+            ).to_arrow()
 
-            result = await tbl.query().where(query_condition).to_pandas()
-            
-            event_list = result['event'].unique().tolist()
+            fields_by_event = {}
+            columns = [result.column(name).to_pylist() for name in ["event", "time", "summary", "start_year"]]
+            for event, time, summary, start_year in zip(*columns):
+                fields = fields_by_event.setdefault(event, {})
+                for field, value in (('time', time), ('summary', summary), ('start_year', start_year)):
+                    if value is not None:
+                        fields.setdefault(field, value)
+            if not fields_by_event:
+                return ''
 
-            for event in event_list:
-                result = await tbl.query().where(f'event = "{event}"').to_pandas()
+            # 按起始年份排序，无法解析的排在最后
+            def sort_key(event):
+                return fields_by_event[event].get('start_year', sys.maxsize)
 
-                content = ''
-                for _, row in result.iterrows():
-                    if row['field'] == 'time':
-                        content += f'**事件时间：**\n   {row["text"]}\n\n'
-                    elif row['field'] == 'summary':
-                        content += f'**事件总结：**\n   {row["text"]}\n\n'
-                    
+            content = ''
+            for event in sorted(fields_by_event, key=sort_key):
+                fields = fields_by_event[event]
+                if 'time' in fields:
+                    content += f'**事件时间：**\n   {fields["time"]}\n\n'
+                if 'summary' in fields:
+                    content += f'**事件总结：**\n   {fields["summary"]}\n\n'
 
             return content
     
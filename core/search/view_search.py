@@ -5,7 +5,11 @@ import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from utils.get_emb import get_emb
+from utils.get_emb import aget_emb
+from utils.index_manager import configure_vector_query
+from utils.db_pool import open_table
+from utils.table_schemas import vector_column
+from core.save_to_db.save_metadata import prepare_detail_table
 
 
 
@@ -29,28 +33,25 @@ async def search_author_view(event_list: list[str] = [], db_path=None):
         return json.dumps([], ensure_ascii=False)
     
     try:
-        # 连接到LanceDB
-        db = await lancedb.connect_async(db_path)
-        
-        # 检查表是否存在
-        if "detail_table" not in await db.table_names():
+        await prepare_detail_table(db_path)
+        tbl = await open_table(db_path, "detail_table")
+        if tbl is None:
             return json.dumps([], ensure_ascii=False)
-        
-        tbl = await db.open_table("detail_table")
 
 
     
 
         for event in event_list:
-            result = await tbl.search(get_emb(event))
-            result = await result.limit(10).where("field='author_view'").to_pandas()
+            result = configure_vector_query(
+                await tbl.search(await aget_emb(event), vector_column_name=vector_column("author_view")), "detail_table")
+            result = await result.limit(10).where("author_view IS NOT NULL").select(["event", "author_view"]).to_pandas()
             
             thought_text_list = []
 
 
             for index, row in result.iterrows():
                 event = row['event']
-                text = row['text']
+                text = row['author_view']
 
                 thought_text_list.append(f"事件\"{event}\"中，作者的观点是：{text}")
 
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.time_normalizer import normalize_time
+
+
+@pytest.mark.parametrize("text, expected", [
+    # 年份
+    ("1937年", (1937, 1937)),
+    ("约1900年", (1900, 1900)),
+    ("1911", (1911, 1911)),
+    ("一九二八年", (1928, 1928)),
+    ("公元三年", (3, 3)),
+    ("战前1937年", (1937, 1937)),
+    ("1937年前后", (1937, 1937)),
+    ("抗战爆发后第三年即1939年", (1939, 1939)),
+    # 公元前
+    ("前206年", (-206, -206)),
+    ("公元前二百二十一年", (-221, -221)),
+    # 日期
+    ("1928年6月4日", (1928, 1928)),
+    ("1928-06-04", (1928, 1928)),
+    ("1928-06", (1928, 1928)),
+    # 范围
+    ("1927年至1937年", (1927, 1937)),
+    ("1927-28", (1927, 1928)),
+    ("公元前221-前206年", (-221, -206)),
+    ("公元前221年-206年", (-221, -206)),
+    # 纪年、年代和世纪
+    ("民国十七年", (1928, 1928)),
+    ("康熙元年", (1662, 1662)),
+    ("1920年代", (1920, 1929)),
+    ("20世纪30年代", (1930, 1939)),
+    # 时长和序数不是年份
+    ("三年后", (None, None)),
+    ("二十年后", (None, None)),
+    ("抗战爆发后第三年", (None, None)),
+    ("200万年前", (None, None)),
+    ("300年间", (None, None)),
+    # 无法解析
+    ("清朝", (None, None)),
+    ("", (None, None)),
+])
+def test_normalize_time(text, expected):
+    assert normalize_time(text) == expected
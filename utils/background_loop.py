@@ -0,0 +1,77 @@
+import gc
+import atexit
+import asyncio
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Coroutine
+
+from utils.constants import BACKGROUND_SHUTDOWN_TIMEOUT_SECONDS
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('BackgroundLoop')
+
+
+class BackgroundLoop:
+    """
+    进程内常驻的后台事件循环
+
+    Flask 的 async 视图每个请求都运行在新的事件循环里，绑定事件循环的长连接客户端
+    无法跨请求复用。需要在进程内共享的异步资源统一放在这个循环里运行，
+    其他事件循环通过 run() 等待结果。
+    进程退出时先按注册顺序执行关闭钩子，等后台任务结束后再停止循环，
+    避免 LanceDB 的回调在解释器退出过程中进入 Python。
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                instance = super(BackgroundLoop, cls).__new__(cls)
+                instance.loop = asyncio.new_event_loop()
+                instance.thread = threading.Thread(
+                    target=instance.loop.run_forever, name="chronolink-background-loop", daemon=True
+                )
+                instance.thread.start()
+                instance.shutdown_hooks = []
+                atexit.register(instance.shutdown)
+                cls._instance = instance
+                logger.info("BackgroundLoop instance created")
+        return cls._instance
+
+    def submit(self, coro: Coroutine) -> Future:
+        """在后台循环中调度协程，可在任意线程调用"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def run(self, coro: Coroutine) -> Any:
+        """在后台循环中运行协程，并在当前事件循环中等待结果"""
+        if asyncio.get_running_loop() is self.loop:
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def add_shutdown_hook(self, hook: Callable[[], Awaitable[None]]) -> None:
+        """注册进程退出时在后台循环中等待的协程函数，按注册顺序执行"""
+        if hook not in self.shutdown_hooks:
+            self.shutdown_hooks.append(hook)
+
+    async def _run_shutdown_hooks(self) -> None:
+        for hook in self.shutdown_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"Shutdown hook {hook.__name__} failed: {e}")
+
+    def shutdown(self) -> None:
+        """等待关闭钩子结束后停止后台循环并等待线程退出，进程退出时自动调用"""
+        if not self.thread.is_alive() or threading.current_thread() is self.thread:
+            return
+        try:
+            self.submit(self._run_shutdown_hooks()).result(timeout=BACKGROUND_SHUTDOWN_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.error(f"Background tasks did not finish before shutdown: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=BACKGROUND_SHUTDOWN_TIMEOUT_SECONDS)
+        # 钩子释放的 LanceDB 对象在解释器仍可用时回收
+        gc.collect()
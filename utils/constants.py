@@ -16,3 +16,31 @@ KIMI_BASE_URL = os.getenv("kimi_base_url")
 COZE_API_KEY = os.getenv("coze_api_key")
 XUNFEI_KEY = os.getenv("xunfei_key")
 XUNFEI_APPID = os.getenv("xunfei_appid")
+EMB_CACHE_PATH = os.getenv("EMB_CACHE_PATH", os.path.join("data", "emb_cache.sqlite3"))
+EMB_CACHE_MAX_ENTRIES = int(os.getenv("EMB_CACHE_MAX_ENTRIES", "200000"))
+EMB_COALESCE_WAIT_MS = float(os.getenv("EMB_COALESCE_WAIT_MS", "5"))
+EMB_MAX_INFLIGHT = int(os.getenv("EMB_MAX_INFLIGHT", "8"))
+VECTOR_INDEX_MIN_ROWS = int(os.getenv("VECTOR_INDEX_MIN_ROWS", "10000"))
+VECTOR_INDEX_REBUILD_ROWS = int(os.getenv("VECTOR_INDEX_REBUILD_ROWS", "5000"))
+SCALAR_INDEX_REBUILD_ROWS = int(os.getenv("SCALAR_INDEX_REBUILD_ROWS", "2000"))
+TIMELINE_PAGE_LIMIT = int(os.getenv("TIMELINE_PAGE_LIMIT", "200"))
+TIMELINE_PAGE_MAX_LIMIT = int(os.getenv("TIMELINE_PAGE_MAX_LIMIT", "1000"))
+TIMELINE_BUCKET_TOP_N = int(os.getenv("TIMELINE_BUCKET_TOP_N", "5"))
+EVENT_DETAIL_BATCH_MAX = int(os.getenv("EVENT_DETAIL_BATCH_MAX", "100"))
+RELATION_GRAPH_MAX_HOPS = int(os.getenv("RELATION_GRAPH_MAX_HOPS", "3"))
+RELATION_GRAPH_MAX_NODES = int(os.getenv("RELATION_GRAPH_MAX_NODES", "200"))
+RELATION_PATH_MAX_DEPTH = int(os.getenv("RELATION_PATH_MAX_DEPTH", "6"))
+LANCEDB_POOL_MAX_TABLES = int(os.getenv("LANCEDB_POOL_MAX_TABLES", "256"))
+LANCEDB_POOL_IDLE_SECONDS = float(os.getenv("LANCEDB_POOL_IDLE_SECONDS", "600"))
+LANCEDB_READ_CONSISTENCY_MS = int(os.getenv("LANCEDB_READ_CONSISTENCY_MS", "0"))
+MAINTENANCE_QUIET_SECONDS = float(os.getenv("MAINTENANCE_QUIET_SECONDS", "30"))
+MAINTENANCE_MIN_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_MIN_INTERVAL_SECONDS", "3600"))
+MAINTENANCE_MAX_FRAGMENTS = int(os.getenv("MAINTENANCE_MAX_FRAGMENTS", "32"))
+MAINTENANCE_MAX_VERSIONS = int(os.getenv("MAINTENANCE_MAX_VERSIONS", "100"))
+MAINTENANCE_SIZE_GROWTH_RATIO = float(os.getenv("MAINTENANCE_SIZE_GROWTH_RATIO", "2.0"))
+MAINTENANCE_KEEP_VERSIONS_HOURS = float(os.getenv("MAINTENANCE_KEEP_VERSIONS_HOURS", "24"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_CONCURRENCY_PER_USER = int(os.getenv("LLM_MAX_CONCURRENCY_PER_USER", "4"))
+BACKGROUND_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("BACKGROUND_SHUTDOWN_TIMEOUT_SECONDS", "60"))
+USER_CACHE_MAX_USERS = int(os.getenv("USER_CACHE_MAX_USERS", "128"))
+USER_CACHE_IDLE_SECONDS = float(os.getenv("USER_CACHE_IDLE_SECONDS", "1800"))
@@ -0,0 +1,151 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+import lancedb
+
+from utils.constants import LANCEDB_POOL_MAX_TABLES, LANCEDB_POOL_IDLE_SECONDS, LANCEDB_READ_CONSISTENCY_MS
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('LanceDBPool')
+
+
+class LanceDBPool:
+    """
+    进程内共享的 LanceDB 连接和数据表句柄
+
+    按数据库路径缓存异步连接，按 (路径, 表名) 缓存打开的表，避免每次请求重复连接和读取元数据。
+    LanceDB 的异步连接和表可以在不同事件循环中使用，所以这里不绑定后台循环。
+    连接设置了读一致性间隔，缓存的表句柄能读到其他句柄写入的新版本。
+    打开的表超过上限时淘汰最久未使用的，长时间未使用的连接和表在下次访问时清理。
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                instance = super(LanceDBPool, cls).__new__(cls)
+                instance.pool_lock = threading.Lock()
+                # 路径 -> (连接, 最近使用时间)
+                instance.connections = OrderedDict()
+                # (路径, 表名) -> (表, 最近使用时间)
+                instance.tables = OrderedDict()
+                instance.last_sweep = time.monotonic()
+                cls._instance = instance
+                logger.info("LanceDBPool instance created")
+        return cls._instance
+
+    def _sweep(self, now: float) -> None:
+        """清理长时间未使用的连接和表，调用方需持有锁"""
+        if now - self.last_sweep < LANCEDB_POOL_IDLE_SECONDS / 10:
+            return
+        self.last_sweep = now
+        for pool in (self.tables, self.connections):
+            while pool:
+                key, (_, last_used) = next(iter(pool.items()))
+                if now - last_used < LANCEDB_POOL_IDLE_SECONDS:
+                    break
+                pool.popitem(last=False)
+
+    def _touch(self, pool: OrderedDict, key: Any) -> Optional[Any]:
+        """取出缓存并更新最近使用时间，调用方需持有锁"""
+        now = time.monotonic()
+        self._sweep(now)
+        item = pool.get(key)
+        if item is None:
+            return None
+        pool[key] = (item[0], now)
+        pool.move_to_end(key)
+        return item[0]
+
+    async def connect(self, user_db_path: str):
+        """获取数据库连接"""
+        key = os.path.abspath(user_db_path)
+        with self.pool_lock:
+            db = self._touch(self.connections, key)
+        if db is not None:
+            return db
+
+        db = await lancedb.connect_async(
+            key, read_consistency_interval=timedelta(milliseconds=LANCEDB_READ_CONSISTENCY_MS)
+        )
+        with self.pool_lock:
+            existing = self._touch(self.connections, key)
+            if existing is not None:
+                return existing
+            self.connections[key] = (db, time.monotonic())
+        return db
+
+    async def open_table(self, user_db_path: str, table_name: str):
+        """
+        获取打开的数据表
+
+        Args:
+            user_db_path: 用户数据库路径
+            table_name: 表名
+
+        Returns:
+            数据表，表不存在时为 None
+        """
+        key = (os.path.abspath(user_db_path), table_name)
+        with self.pool_lock:
+            tbl = self._touch(self.tables, key)
+        if tbl is not None:
+            return tbl
+
+        db = await self.connect(user_db_path)
+        # 表不存在的结果不缓存，之后建表可以立即被发现
+        if table_name not in await db.table_names():
+            return None
+        tbl = await db.open_table(table_name)
+
+        with self.pool_lock:
+            self.tables[key] = (tbl, time.monotonic())
+            self.tables.move_to_end(key)
+            while len(self.tables) > LANCEDB_POOL_MAX_TABLES:
+                self.tables.popitem(last=False)
+        return tbl
+
+    def invalidate(self, user_db_path: str, table_name: Optional[str] = None) -> None:
+        """
+        建表、覆盖或删除表之后丢弃缓存的表句柄
+
+        Args:
+            user_db_path: 用户数据库路径
+            table_name: 表名，为空时丢弃该数据库的全部表句柄
+        """
+        path = os.path.abspath(user_db_path)
+        with self.pool_lock:
+            for key in [key for key in self.tables if key[0] == path and (table_name is None or key[1] == table_name)]:
+                del self.tables[key]
+
+    def clear(self) -> None:
+        """丢弃全部连接和表句柄，进程退出前释放 LanceDB 的对象"""
+        with self.pool_lock:
+            self.tables.clear()
+            self.connections.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.pool_lock:
+            return {"connections": len(self.connections), "tables": len(self.tables)}
+
+
+async def get_db(user_db_path: str):
+    """从连接池获取数据库连接"""
+    return await LanceDBPool().connect(user_db_path)
+
+
+async def open_table(user_db_path: str, table_name: str):
+    """从连接池获取数据表，表不存在时为 None"""
+    return await LanceDBPool().open_table(user_db_path, table_name)
+
+
+def invalidate_table(user_db_path: str, table_name: Optional[str] = None) -> None:
+    """建表、覆盖或删除表之后丢弃连接池中的表句柄"""
+    LanceDBPool().invalidate(user_db_path, table_name)
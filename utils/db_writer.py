@@ -0,0 +1,194 @@
+import time
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List
+
+import pyarrow as pa
+
+from utils.background_loop import BackgroundLoop
+from utils.db_pool import LanceDBPool, get_db, open_table
+from utils.maintenance import schedule_maintenance
+from utils.index_manager import schedule_index_check, wait_for_index_builds
+from utils.table_schemas import TABLE_SCHEMAS
+from utils.user_cache import UserCache
+
+
+async def append_rows(db, table_name: str, data: pa.Table, check_index: bool = True) -> None:
+    """
+    追加写入数据表，表不存在时按 TABLE_SCHEMAS 的列定义创建，写入后在后台检查索引
+
+    Args:
+        db: 数据库连接
+        table_name: 表名
+        data: 由 make_table 构建的 Arrow 表，写入旧表时由 LanceDB 转换成旧表的类型
+        check_index: 是否在写入后检查索引，可能回滚的写入由调用方在确认成功后再检查
+    """
+    if data.num_rows == 0:
+        return
+    tbl = await open_table(db.uri, table_name)
+    if tbl is None:
+        await db.create_table(table_name, data=data, schema=TABLE_SCHEMAS.get(table_name))
+    else:
+        await tbl.add(data)
+    if check_index:
+        schedule_index_check(db, table_name)
+
+
+class UserDBWriter:
+    """
+    单个用户数据库的写入队列
+
+    同一个数据库的所有写操作在这里串行执行，排队中的追加写入按表合并成一次 add，
+    读操作不经过这里，可以并行。队列空闲一段时间后在后台整理碎片和旧版本。
+    只在后台事件循环中使用。
+    """
+
+    def __init__(self, user_db_path: str):
+        self.user_db_path = user_db_path
+        self.db = None
+        self.queue = deque()
+        self.worker_task = None
+        self.last_activity = time.monotonic()
+        self.maintenance_task = None
+
+    def submit_rows(self, table_name: str, data: pa.Table) -> asyncio.Future:
+        """提交追加写入"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append(("add", table_name, data, future))
+        self.last_activity = time.monotonic()
+        self._ensure_worker()
+        return future
+
+    def submit_exclusive(self, fn: Callable[[Any], Awaitable[Any]]) -> asyncio.Future:
+        """提交需要独占数据库的操作，例如先读后写的检查"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append(("exclusive", None, fn, future))
+        self.last_activity = time.monotonic()
+        self._ensure_worker()
+        return future
+
+    def is_idle(self) -> bool:
+        """没有排队的写入、正在运行的队列和等待中的整理，可以从缓存中淘汰"""
+        return (not self.queue and (self.worker_task is None or self.worker_task.done())
+                and self.maintenance_task is None)
+
+    def _ensure_worker(self) -> None:
+        if self.worker_task is None or self.worker_task.done():
+            self.worker_task = asyncio.ensure_future(self._worker())
+
+    async def _worker(self) -> None:
+        """依次处理队列，直到队列为空"""
+        if self.db is None:
+            self.db = await get_db(self.user_db_path)
+
+        while self.queue:
+            # 一次取出当前排队的全部操作
+            items = list(self.queue)
+            self.queue.clear()
+
+            pending_rows: Dict[str, List] = {}
+            pending_futures: Dict[str, List[asyncio.Future]] = {}
+            for kind, table_name, payload, future in items:
+                if kind == "add":
+                    pending_rows.setdefault(table_name, []).append(payload)
+                    pending_futures.setdefault(table_name, []).append(future)
+                    continue
+
+                # 独占操作之前先把已排队的写入落盘，保证顺序
+                await self._flush(pending_rows, pending_futures)
+                pending_rows, pending_futures = {}, {}
+                try:
+                    future.set_result(await payload(self.db))
+                except Exception as e:
+                    future.set_exception(e)
+
+            await self._flush(pending_rows, pending_futures)
+
+        self.last_activity = time.monotonic()
+        schedule_maintenance(self)
+
+    async def _flush(self, pending_rows: Dict[str, List], pending_futures: Dict[str, List[asyncio.Future]]) -> None:
+        """每张表一次 add 写入合并后的数据"""
+        for table_name, tables in pending_rows.items():
+            try:
+                await append_rows(self.db, table_name, pa.concat_tables(tables))
+                error = None
+            except Exception as e:
+                print(f"写入 {table_name} 出错: {e}", self.user_db_path)
+                error = e
+            for future in pending_futures[table_name]:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+
+# 只淘汰空闲的写入队列，同一数据库同时只有一个队列在写
+_writers = UserCache(evictable=UserDBWriter.is_idle)
+
+
+def _get_writer(user_db_path: str) -> UserDBWriter:
+    """获取数据库对应的写入队列，只在后台事件循环中调用"""
+    BackgroundLoop().add_shutdown_hook(_drain_writers)
+    return _writers.get(user_db_path, UserDBWriter)
+
+
+async def _drain_writers() -> None:
+    """
+    进程退出时由 BackgroundLoop 调用：取消等待中的整理，等排队的写入全部落盘，
+    再等写入触发的索引构建结束，最后释放连接，LanceDB 的对象不能留到解释器退出时才回收
+    """
+    while True:
+        tasks = []
+        for writer in _writers.values():
+            # 整理任务在写入队列中执行的部分由 worker 完成，取消只会放弃还没开始的整理
+            if writer.maintenance_task is not None:
+                writer.maintenance_task.cancel()
+                tasks.append(writer.maintenance_task)
+            if writer.worker_task is not None and not writer.worker_task.done():
+                tasks.append(writer.worker_task)
+        if not tasks:
+            break
+        await asyncio.wait(tasks)
+    await wait_for_index_builds()
+    for writer in _writers.values():
+        writer.db = None
+    LanceDBPool().clear()
+
+
+async def _write_rows(user_db_path: str, table_name: str, data: pa.Table) -> None:
+    await _get_writer(user_db_path).submit_rows(table_name, data)
+
+
+async def _run_exclusive(user_db_path: str, fn: Callable[[Any], Awaitable[Any]]) -> Any:
+    return await _get_writer(user_db_path).submit_exclusive(fn)
+
+
+async def write_rows(user_db_path: str, table_name: str, data: pa.Table) -> None:
+    """
+    通过写入队列追加数据
+
+    Args:
+        user_db_path: 用户数据库路径
+        table_name: 表名
+        data: 由 make_table 构建的 Arrow 表
+    """
+    if data.num_rows == 0:
+        return
+    await BackgroundLoop().run(_write_rows(user_db_path, table_name, data))
+
+
+async def run_exclusive(user_db_path: str, fn: Callable[[Any], Awaitable[Any]]) -> Any:
+    """
+    在写入队列中独占执行 fn(db)，与同一数据库的其他写操作串行
+
+    Args:
+        user_db_path: 用户数据库路径
+        fn: 接收数据库连接的协程函数，内部直接读写，不能再调用 write_rows
+
+    Returns:
+        Any: fn 的返回值
+    """
+    return await BackgroundLoop().run(_run_exclusive(user_db_path, fn))
@@ -0,0 +1,156 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+from utils.constants import EMB_CACHE_PATH, EMB_CACHE_MAX_ENTRIES
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('EmbeddingCache')
+
+
+class EmbeddingCache:
+    """
+    进程间共享的向量缓存，所有用户共用
+
+    以 (模型, 维度, 文本md5) 为键保存在 sqlite 中，条目数超过上限时按最近访问时间淘汰。
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                instance = super(EmbeddingCache, cls).__new__(cls)
+                instance._init_db(EMB_CACHE_PATH, EMB_CACHE_MAX_ENTRIES)
+                cls._instance = instance
+                logger.info("EmbeddingCache instance created")
+        return cls._instance
+
+    def _init_db(self, db_path: str, max_entries: int) -> None:
+        """打开缓存数据库，WAL 模式允许多个进程同时读写"""
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.db_lock = threading.Lock()
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS emb_cache ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_emb_cache_access ON emb_cache (last_access)")
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COUNT(*) FROM emb_cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(text: str, model: str, dimensions: int) -> str:
+        """按模型、维度和全文 md5 生成缓存键"""
+        text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
+        return f"{model}:{dimensions}:{text_hash}"
+
+    def get_many(self, texts: List[str], model: str, dimensions: int) -> Dict[str, List[float]]:
+        """
+        批量读取缓存
+
+        Args:
+            texts: 文本列表
+            model: 向量模型名称
+            dimensions: 向量维度
+
+        Returns:
+            Dict[str, List[float]]: 命中的文本及其向量
+        """
+        keys = {self.make_key(text, model, dimensions): text for text in texts}
+        if not keys:
+            return {}
+
+        found = {}
+        key_list = list(keys)
+        with self.db_lock:
+            # sqlite 单条语句的参数个数有限，分段查询
+            for start in range(0, len(key_list), 500):
+                part = key_list[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM emb_cache WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[keys[key]] = array('f', blob).tolist()
+
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE emb_cache SET last_access = ? WHERE key = ?",
+                    [(now, self.make_key(text, model, dimensions)) for text in found]
+                )
+                self.conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def get(self, text: str, model: str, dimensions: int) -> Optional[List[float]]:
+        """读取单条缓存，未命中返回 None"""
+        return self.get_many([text], model, dimensions).get(text)
+
+    def put_many(self, embs: Dict[str, List[float]], model: str, dimensions: int) -> None:
+        """
+        批量写入缓存，超出上限时淘汰最久未访问的条目
+
+        Args:
+            embs: 文本到向量的映射
+            model: 向量模型名称
+            dimensions: 向量维度
+        """
+        if not embs:
+            return
+
+        now = time.time()
+        rows = [
+            (self.make_key(text, model, dimensions), array('f', emb).tobytes(), now)
+            for text, emb in embs.items()
+        ]
+        with self.db_lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO emb_cache (key, vector, last_access) VALUES (?, ?, ?)", rows
+            )
+            self.size = self.conn.execute("SELECT COUNT(*) FROM emb_cache").fetchone()[0]
+
+            overflow = self.size - self.max_entries
+            if overflow > 0:
+                self.conn.execute(
+                    "DELETE FROM emb_cache WHERE key IN "
+                    "(SELECT key FROM emb_cache ORDER BY last_access LIMIT ?)", (overflow,)
+                )
+                self.size -= overflow
+                self.evictions += overflow
+            self.conn.commit()
+
+    def put(self, text: str, emb: List[float], model: str, dimensions: int) -> None:
+        """写入单条缓存"""
+        self.put_many({text: emb}, model, dimensions)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存命中统计"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": self.size,
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,101 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Set
+
+
+class EmbeddingCoalescer:
+    """
+    合并并发的向量请求
+
+    各个协程提交的文本先在队列中等待几毫秒，或者攒够一个批次后立即发送，
+    合并成一次批量 API 调用，再把结果分发给各自的调用方。
+    只能在同一个事件循环中使用（进程内由 BackgroundLoop 持有）。
+    """
+
+    def __init__(self, request_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 max_batch_size: int = 10, max_wait_ms: float = 5, max_inflight: int = 8):
+        """
+        Args:
+            request_fn: 发送一次批量向量请求的协程函数
+            max_batch_size: 单次请求的最大输入条数
+            max_wait_ms: 首个请求进入队列后最多等待的毫秒数
+            max_inflight: 同时进行中的 API 请求上限
+        """
+        self.request_fn = request_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.semaphore = asyncio.Semaphore(max_inflight)
+
+        # 文本 -> 等待该文本结果的 future 列表，相同文本只请求一次
+        self.pending: Dict[str, List[asyncio.Future]] = {}
+        self.flush_handle = None
+        self.send_tasks: Set[asyncio.Task] = set()
+
+        self.texts_requested = 0
+        self.texts_sent = 0
+        self.batches_sent = 0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        提交文本并等待合并请求的结果
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            List[List[float]]: 与输入顺序一致的向量列表
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self.pending.setdefault(text, []).append(future)
+            futures.append(future)
+            if len(self.pending) >= self.max_batch_size:
+                self._flush()
+
+        self.texts_requested += len(texts)
+        if self.pending and self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self) -> None:
+        """把当前队列作为一个批次发送"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, {}
+        task = asyncio.ensure_future(self._send(batch))
+        self.send_tasks.add(task)
+        task.add_done_callback(self.send_tasks.discard)
+
+    async def _send(self, batch: Dict[str, List[asyncio.Future]]) -> None:
+        """发送批量请求并把结果分发给等待的调用方，失败时所有调用方都收到异常"""
+        texts = list(batch)
+        try:
+            async with self.semaphore:
+                embs = await self.request_fn(texts)
+            self.batches_sent += 1
+            self.texts_sent += len(texts)
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for text, emb in zip(texts, embs):
+            for future in batch[text]:
+                if not future.done():
+                    future.set_result(emb)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取合并请求的统计"""
+        return {
+            "texts_requested": self.texts_requested,
+            "texts_sent": self.texts_sent,
+            "batches_sent": self.batches_sent,
+        }
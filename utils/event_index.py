@@ -0,0 +1,226 @@
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from utils.db_pool import open_table
+from utils.user_cache import UserCache
+
+
+class EventDedupIndex:
+    """
+    单个用户的事件去重索引
+
+    按年份保存已入库事件标题的归一化向量，每个年份一个连续的 NumPy 矩阵，
+    首次使用时从 event_table 加载，之后随新事件的写入增量更新。
+    随文档批次提交的新事件在检查时先加入索引（预留），防止并发上传的文档重复写入同一事件，
+    文档提交成功后确认，失败时只移除该文档预留的事件。
+    """
+
+    def __init__(self, user_db_path: str):
+        self.user_db_path = user_db_path
+        self.loaded = False
+        self.lock = threading.Lock()
+        # 年份 -> 事件名称列表 / 预留容量的向量矩阵 / 已使用的行数
+        self.events: Dict[str, List[str]] = {}
+        self.buffers: Dict[str, np.ndarray] = {}
+        self.sizes: Dict[str, int] = {}
+        # 已加入索引但所在文档尚未提交的 (年份, 事件名称)
+        self.reserved: Set[Tuple[str, str]] = set()
+
+    async def load(self) -> None:
+        """从 event_table 加载全部事件向量，只在第一次使用时执行"""
+        if self.loaded:
+            return
+
+        tbl = await open_table(self.user_db_path, "event_table")
+        if tbl is not None:
+            result = await tbl.query().select(["event", "time", "vector"]).to_pandas()
+        else:
+            result = None
+
+        with self.lock:
+            if self.loaded:
+                return
+            if result is not None and not result.empty:
+                for time_dir, group in result.groupby("time", sort=False):
+                    self._append(str(time_dir), group["event"].tolist(), np.stack(group["vector"].values))
+            self.loaded = True
+
+    @staticmethod
+    def _normalize(embs) -> np.ndarray:
+        """转换为 float32 矩阵并按行归一化"""
+        matrix = np.asarray(embs, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[np.newaxis, :]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _append(self, time_dir: str, events: List[str], embs) -> None:
+        """追加到年份矩阵，容量不足时按倍数扩容，调用方需持有锁"""
+        vectors = self._normalize(embs)
+        size = self.sizes.get(time_dir, 0)
+        buffer = self.buffers.get(time_dir)
+        needed = size + len(vectors)
+
+        if buffer is None or buffer.shape[0] < needed:
+            capacity = max(needed, 2 * (buffer.shape[0] if buffer is not None else 0), 16)
+            new_buffer = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            if buffer is not None:
+                new_buffer[:size] = buffer[:size]
+            buffer = new_buffer
+            self.buffers[time_dir] = buffer
+
+        buffer[size:needed] = vectors
+        self.sizes[time_dir] = needed
+        self.events.setdefault(time_dir, []).extend(events)
+
+    def add(self, events: List[str], time_dirs: List[str], embs, reserve: bool = False) -> None:
+        """
+        写入新接受的事件
+
+        Args:
+            events: 事件名称列表
+            time_dirs: 与事件对应的年份列表
+            embs: 与事件对应的标题向量
+            reserve: 事件随文档批次提交，尚未写入 event_table
+        """
+        vectors = self._normalize(embs)
+        with self.lock:
+            for i, (event, time_dir) in enumerate(zip(events, time_dirs)):
+                self._append(time_dir, [event], vectors[i:i + 1])
+                if reserve:
+                    self.reserved.add((time_dir, event))
+
+    def remove(self, reserved: List[Tuple[str, str]]) -> None:
+        """
+        移除文档预留但没有提交的事件，其他文档预留的事件不受影响
+
+        Args:
+            reserved: 文档预留的 (年份, 事件名称)
+        """
+        with self.lock:
+            for time_dir, event in reserved:
+                if (time_dir, event) not in self.reserved:
+                    continue
+                self.reserved.discard((time_dir, event))
+                events = self.events[time_dir]
+                # 预留的事件总是最后加入的同名事件
+                position = len(events) - 1 - events[::-1].index(event)
+                size = self.sizes[time_dir]
+                buffer = self.buffers[time_dir]
+                buffer[position:size - 1] = buffer[position + 1:size]
+                self.sizes[time_dir] = size - 1
+                del events[position]
+
+    def confirm(self, reserved: List[Tuple[str, str]]) -> None:
+        """文档提交成功后，预留的事件已写入 event_table"""
+        with self.lock:
+            self.reserved.difference_update(reserved)
+
+    def has_reserved(self) -> bool:
+        """是否有尚未提交的预留事件"""
+        with self.lock:
+            return bool(self.reserved)
+
+    def match(self, embs, time_dirs: List[str], threshold: float = 0.8) -> List[Optional[str]]:
+        """
+        查找每个向量在同一年份中最相似的已有事件
+
+        同一年份的查询向量一次矩阵乘法完成比较。
+
+        Args:
+            embs: 查询向量
+            time_dirs: 与查询向量对应的年份列表
+            threshold: 余弦相似度阈值，超过即视为重复
+
+        Returns:
+            List[Optional[str]]: 重复时为已有事件名称，否则为 None
+        """
+        if len(time_dirs) == 0:
+            return []
+
+        queries = self._normalize(embs)
+        matches: List[Optional[str]] = [None] * len(time_dirs)
+
+        positions_by_time: Dict[str, List[int]] = {}
+        for i, time_dir in enumerate(time_dirs):
+            positions_by_time.setdefault(time_dir, []).append(i)
+
+        with self.lock:
+            for time_dir, positions in positions_by_time.items():
+                size = self.sizes.get(time_dir, 0)
+                if size == 0:
+                    continue
+                sims = queries[positions] @ self.buffers[time_dir][:size].T
+                best = sims.argmax(axis=1)
+                for row, position in enumerate(positions):
+                    if sims[row, best[row]] > threshold:
+                        matches[position] = self.events[time_dir][best[row]]
+
+        return matches
+
+
+def cluster_new_events(embs, time_dirs: List[str], candidates: List[int],
+                       threshold: float = 0.8) -> Dict[int, int]:
+    """
+    同一文档内的事件互相去重
+
+    一次计算候选事件两两之间的相似度，按原顺序保留每组相似事件中的第一个。
+
+    Args:
+        embs: 文档中全部事件的向量
+        time_dirs: 与事件对应的年份列表
+        candidates: 需要参与比较的事件下标（未匹配到已有事件的）
+        threshold: 余弦相似度阈值
+
+    Returns:
+        Dict[int, int]: 被合并事件的下标 -> 保留事件的下标
+    """
+    if len(candidates) < 2:
+        return {}
+
+    vectors = EventDedupIndex._normalize(embs)[candidates]
+    sims = vectors @ vectors.T
+    years = np.asarray([time_dirs[i] for i in candidates], dtype=object)
+    # 不同年份的事件不合并
+    sims[years[:, None] != years[None, :]] = -1.0
+
+    merged = {}
+    kept: List[int] = []
+    for row, position in enumerate(candidates):
+        if kept:
+            kept_sims = sims[row, kept]
+            best = int(kept_sims.argmax())
+            if kept_sims[best] > threshold:
+                merged[position] = candidates[kept[best]]
+                continue
+        kept.append(row)
+    return merged
+
+
+# 长时间未使用或超过用户数上限的索引被淘汰，下次使用时从 event_table 重新加载，
+# 有未提交的预留事件时不淘汰，否则重新加载后会丢失这些事件
+_indexes = UserCache(evictable=lambda index: not index.has_reserved())
+
+
+async def get_event_index(user_db_path: str) -> EventDedupIndex:
+    """获取用户的事件去重索引，进程内每个数据库只加载一次"""
+    index = _indexes.get(user_db_path, EventDedupIndex)
+    await index.load()
+    return index
+
+
+def remove_reserved_events(user_db_path: str, reserved: List[Tuple[str, str]]) -> None:
+    """文档处理或提交失败时，从去重索引中移除该文档预留的事件"""
+    index = _indexes.get(user_db_path)
+    if index is not None and reserved:
+        index.remove(reserved)
+
+
+def confirm_reserved_events(user_db_path: str, reserved: List[Tuple[str, str]]) -> None:
+    """文档提交成功后确认该文档预留的事件"""
+    index = _indexes.get(user_db_path)
+    if index is not None and reserved:
+        index.confirm(reserved)
@@ -8,4 +8,8 @@ def generate_id_from_chinese(text: str) -> str:
    
     md5_hash = hashlib.md5(text_bytes)
    
-    return md5_hash.hexdigest()
\ No newline at end of file
+    return md5_hash.hexdigest()
+
+def sql_string(value: str) -> str:
+    """把字符串写成 LanceDB 过滤条件中的单引号字面量，单引号加倍转义"""
+    return "'" + str(value).replace("'", "''") + "'"
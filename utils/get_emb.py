@@ -1,44 +1,89 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
 import os
 import sys
 
-from utils.constants import DASHSCOPE_API_KEY, DASHSCOPE_BASE_URL
+from utils.constants import DASHSCOPE_API_KEY, DASHSCOPE_BASE_URL, EMB_COALESCE_WAIT_MS, EMB_MAX_INFLIGHT
+from utils.emb_cache import EmbeddingCache
+from utils.background_loop import BackgroundLoop
+from utils.emb_coalescer import EmbeddingCoalescer
+from utils.event_index import get_event_index, cluster_new_events
+from utils.db_writer import append_rows, run_exclusive
+from utils.table_schemas import VECTOR_DIMENSIONS, make_table
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from scipy.spatial.distance import cosine
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import asyncio
 import lancedb
 
 
 
 
-async def check_exists_event(new_event: str, time_dir: str, user_db_path: str) -> bool:
-    """检查新事件是否在事件列表中"""
+# DashScope text-embedding-v3 单次请求最多接受 10 条输入
+EMB_MODEL = "text-embedding-v3"
+EMB_DIMENSIONS = VECTOR_DIMENSIONS
+EMB_MAX_BATCH_SIZE = 10
+
+
+async def check_exists_events(new_events: List[str], time_dirs: List[str], user_db_path: str,
+                              new_embs: Optional[List[List[float]]] = None, batch=None) -> List[Optional[str]]:
+    """
+    批量检查事件是否已存在，新事件一次写入 event_table
+
+    先与已入库事件比较，再在文档内部互相比较，文档内的近似重复事件合并到最先出现的那个。
+    检查和写入在用户的写入队列中独占执行，同一用户并发上传时不会重复写入同一事件。
+
+    Args:
+        new_events: 事件名称列表
+        time_dirs: 与事件对应的年份列表
+        user_db_path: 用户数据库路径
+        new_embs: 已批量计算好的事件向量，为空时重新计算
+        batch: 文档的写入批次，给出时新事件随文档一起提交并在去重索引中预留，否则立即写入
+
+    Returns:
+        List[Optional[str]]: 与已入库事件重复时为已有事件名称，
+            与文档内先出现的事件重复时为该事件名称，新事件为 None
+    """
+    if not new_events:
+        return []
+    if new_embs is None:
+        new_embs = await aget_emb_batch(new_events)
+
+    async def dedup_and_save(db) -> List[Optional[str]]:
+        index = await get_event_index(user_db_path)
+        matches = index.match(new_embs, time_dirs, threshold=0.8)
+
+        candidates = [i for i, match in enumerate(matches) if match is None]
+        merged = cluster_new_events(new_embs, time_dirs, candidates, threshold=0.8)
+        for position, kept_position in merged.items():
+            matches[position] = new_events[kept_position]
+
+        accepted = [i for i in candidates if i not in merged]
+        if accepted:
+            data = make_table("event_table", {
+                "vector": [new_embs[i] for i in accepted],
+                "event": [new_events[i] for i in accepted],
+                "time": [time_dirs[i] for i in accepted],
+            })
+            if batch is not None:
+                batch.add_table("event_table", data)
+                batch.reserve_events([(time_dirs[i], new_events[i]) for i in accepted])
+            else:
+                await append_rows(db, "event_table", data)
+            index.add([new_events[i] for i in accepted], [time_dirs[i] for i in accepted],
+                      [new_embs[i] for i in accepted], reserve=batch is not None)
 
-    try:
-        
-        new_emb = get_emb(new_event)
+        return matches
 
-        db = await lancedb.connect_async(user_db_path)
-        if "event_table" not in await db.table_names():
-            tbl = await db.create_table("event_table", data=[{"vector": new_emb, "event": new_event, "time": time_dir}])
-        else:
-            tbl = await db.open_table("event_table")
-    
-            search_result = await tbl.search(new_emb)
-            result = await search_result.where(f"time = '{time_dir}'").limit(1).to_pandas()
+    return await run_exclusive(user_db_path, dedup_and_save)
 
-            if result.empty:
-                await tbl.add([{"vector": new_emb, "event": new_event, "time": time_dir}])
-                return False
-        
-            sim = 1 - cosine(new_emb, result['vector'][0])
-            
-            if sim > 0.8:
-                return result['event'][0]
-            else:
-                await tbl.add([{"vector": new_emb, "event": new_event, "time": time_dir}])
-                return False
+
+async def check_exists_event(new_event: str, time_dir: str, user_db_path: str,
+                             new_emb: Optional[List[float]] = None) -> bool:
+    """检查新事件是否在事件列表中，new_emb 为已批量计算好的事件向量"""
+
+    try:
+        new_embs = [new_emb] if new_emb is not None else None
+        match = (await check_exists_events([new_event], [time_dir], user_db_path, new_embs))[0]
+        return match if match else False
   
     except Exception as e:
         print(f"检查事件时出错: {e}", new_event, time_dir, user_db_path)
@@ -46,21 +91,158 @@ async def check_exists_event(new_event: str, time_dir: str, user_db_path: str) -
 
 def get_emb(text: str) -> List[float]:
     
+    return get_emb_batch([text])[0]
+
 
-    client = OpenAI(
-        api_key=DASHSCOPE_API_KEY,
-        base_url=DASHSCOPE_BASE_URL)
+_sync_client = None
+_async_client = None
+_coalescer = None
 
-    completion = client.embeddings.create(
-        model="text-embedding-v3",
-        input=text,
-        dimensions=1024,
+
+def _get_sync_client() -> OpenAI:
+    """进程内共用的同步客户端，复用 HTTP 连接"""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = OpenAI(
+            api_key=DASHSCOPE_API_KEY,
+            base_url=DASHSCOPE_BASE_URL)
+    return _sync_client
+
+
+def _get_async_client() -> AsyncOpenAI:
+    """进程内共用的异步客户端，只在后台事件循环中使用，长连接在请求之间复用"""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            api_key=DASHSCOPE_API_KEY,
+            base_url=DASHSCOPE_BASE_URL)
+    return _async_client
+
+
+def _get_coalescer() -> EmbeddingCoalescer:
+    """进程内共用的请求合并器，只在后台事件循环中使用"""
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = EmbeddingCoalescer(
+            _request_embs,
+            max_batch_size=EMB_MAX_BATCH_SIZE,
+            max_wait_ms=EMB_COALESCE_WAIT_MS,
+            max_inflight=EMB_MAX_INFLIGHT)
+    return _coalescer
+
+
+def get_emb_stats() -> Dict[str, Dict[str, int]]:
+    """
+    向量缓存和请求合并器的统计
+
+    Returns:
+        Dict[str, Dict[str, int]]: cache 为缓存命中、未命中和淘汰数，coalescer 为合并前后的文本数和请求数
+    """
+    coalescer = _coalescer.get_stats() if _coalescer is not None else {
+        "texts_requested": 0, "texts_sent": 0, "batches_sent": 0}
+    return {"cache": EmbeddingCache().get_stats(), "coalescer": coalescer}
+
+
+async def _coalesced_embs(texts: List[str]) -> List[List[float]]:
+    """在后台事件循环中把文本交给请求合并器"""
+    return await _get_coalescer().embed(texts)
+
+
+def _split_cached(texts: List[str]) -> Tuple[Dict[str, List[float]], List[str]]:
+    """
+    查询缓存并对未命中的文本去重
+
+    Returns:
+        Tuple[Dict[str, List[float]], List[str]]: 命中的向量，以及需要请求的文本
+    """
+    emb_by_text = EmbeddingCache().get_many(texts, EMB_MODEL, EMB_DIMENSIONS)
+    missing_texts = [text for text in dict.fromkeys(texts) if text not in emb_by_text]
+    return emb_by_text, missing_texts
+
+
+def _to_embs(completion) -> List[List[float]]:
+    """返回结果按 index 对应输入位置"""
+    return [item.embedding for item in sorted(completion.data, key=lambda item: item.index)]
+
+
+def get_emb_batch(texts: List[str], batch_size: int = EMB_MAX_BATCH_SIZE) -> List[List[float]]:
+    """
+    批量获取文本向量，一次请求发送多条输入
+
+    Args:
+        texts: 文本列表
+        batch_size: 单次请求的最大输入条数
+
+    Returns:
+        List[List[float]]: 与输入顺序一致的向量列表
+    """
+    if not texts:
+        return []
+
+    # 批内去重，相同文本只请求一次；缓存命中的文本不再请求
+    emb_by_text, missing_texts = _split_cached(texts)
+    if not missing_texts:
+        return [emb_by_text[text] for text in texts]
+
+    client = _get_sync_client()
+
+    new_embs = {}
+    for start in range(0, len(missing_texts), batch_size):
+        batch = missing_texts[start:start + batch_size]
+        completion = client.embeddings.create(
+            model=EMB_MODEL,
+            input=batch,
+            dimensions=EMB_DIMENSIONS,
+            encoding_format="float"
+        )
+        new_embs.update(zip(batch, _to_embs(completion)))
+
+    EmbeddingCache().put_many(new_embs, EMB_MODEL, EMB_DIMENSIONS)
+    emb_by_text.update(new_embs)
+    return [emb_by_text[text] for text in texts]
+
+
+async def _request_embs(texts: List[str]) -> List[List[float]]:
+    """在后台事件循环中发送一次批量向量请求"""
+    completion = await _get_async_client().embeddings.create(
+        model=EMB_MODEL,
+        input=texts,
+        dimensions=EMB_DIMENSIONS,
         encoding_format="float"
     )
+    return _to_embs(completion)
 
 
-    
-    return completion.data[0].embedding
+async def aget_emb_batch(texts: List[str]) -> List[List[float]]:
+    """
+    get_emb_batch 的异步版本，不阻塞调用方的事件循环
+
+    未命中缓存的文本交给请求合并器，与其他并发请求中的文本合并成批量 API 调用
+
+    Args:
+        texts: 文本列表
+
+    Returns:
+        List[List[float]]: 与输入顺序一致的向量列表
+    """
+    if not texts:
+        return []
+
+    emb_by_text, missing_texts = _split_cached(texts)
+    if not missing_texts:
+        return [emb_by_text[text] for text in texts]
+
+    embs = await BackgroundLoop().run(_coalesced_embs(missing_texts))
+    new_embs = dict(zip(missing_texts, embs))
+
+    EmbeddingCache().put_many(new_embs, EMB_MODEL, EMB_DIMENSIONS)
+    emb_by_text.update(new_embs)
+    return [emb_by_text[text] for text in texts]
+
+
+async def aget_emb(text: str) -> List[float]:
+    """get_emb 的异步版本"""
+    return (await aget_emb_batch([text]))[0]
 
 
 if __name__ == "__main__":
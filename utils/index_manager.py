@@ -0,0 +1,230 @@
+import os
+import asyncio
+from typing import Any, Dict, List, Set
+
+from lancedb.index import IvfPq, HnswSq, BTree
+
+from utils.background_loop import BackgroundLoop
+from utils.db_pool import open_table
+from utils.table_schemas import EMBEDDED_FIELDS, vector_column
+from utils.constants import VECTOR_INDEX_MIN_ROWS, VECTOR_INDEX_REBUILD_ROWS, SCALAR_INDEX_REBUILD_ROWS
+
+# 各向量表的索引配置
+# columns: 需要索引的向量列，默认为 vector
+# index_type: IVF_PQ 或 IVF_HNSW_SQ
+# min_rows: 行数达到后创建索引
+# rebuild_rows: 未进入索引的新增行数达到后重建索引
+# nprobes / refine_factor: 查询时的参数
+VECTOR_INDEX_SETTINGS: Dict[str, Dict[str, Any]] = {
+    "detail_table": {
+        "columns": [vector_column(field) for field in EMBEDDED_FIELDS],
+        "index_type": "IVF_PQ",
+        "min_rows": VECTOR_INDEX_MIN_ROWS,
+        "rebuild_rows": VECTOR_INDEX_REBUILD_ROWS,
+        "nprobes": 20,
+        "refine_factor": 10,
+    },
+    "event_table": {
+        "index_type": "IVF_HNSW_SQ",
+        "min_rows": VECTOR_INDEX_MIN_ROWS,
+        "rebuild_rows": VECTOR_INDEX_REBUILD_ROWS,
+        "nprobes": 10,
+        "refine_factor": None,
+    },
+    "article_segment_emb_table": {
+        "index_type": "IVF_PQ",
+        "min_rows": VECTOR_INDEX_MIN_ROWS,
+        "rebuild_rows": VECTOR_INDEX_REBUILD_ROWS,
+        "nprobes": 20,
+        "refine_factor": 10,
+    },
+}
+
+VECTOR_COLUMN = "vector"
+
+# 各表用于过滤的标量列索引，过滤列都是取值多的文本或年份，使用 BTREE
+# 未进入索引的新增行数达到 SCALAR_INDEX_REBUILD_ROWS 后重建
+SCALAR_INDEX_SETTINGS: Dict[str, Dict[str, str]] = {
+    "detail_table": {
+        "event": "BTREE",
+        "title": "BTREE",
+        "start_year": "BTREE",
+        "end_year": "BTREE",
+    },
+    "relations_table": {
+        "event_1": "BTREE",
+        "event_2": "BTREE",
+    },
+}
+
+# 正在建索引的 (数据库, 表)，避免重复构建
+_building: Set[str] = set()
+# (数据库, 表) -> 正在运行的索引检查任务
+_index_tasks: Dict[str, asyncio.Task] = {}
+
+
+def is_index_building(user_db_path: str, table_name: str) -> bool:
+    """数据表是否正在后台构建索引"""
+    return f"{os.path.abspath(user_db_path)}:{table_name}" in _building
+
+
+def configure_vector_query(query, table_name: str):
+    """
+    为向量查询设置表对应的 nprobes / refine_factor
+
+    Args:
+        query: tbl.search() 返回的向量查询
+        table_name: 表名
+
+    Returns:
+        设置参数后的查询
+    """
+    settings = VECTOR_INDEX_SETTINGS.get(table_name)
+    if not settings:
+        return query
+    if settings.get("nprobes"):
+        query = query.nprobes(settings["nprobes"])
+    if settings.get("refine_factor"):
+        query = query.refine_factor(settings["refine_factor"])
+    return query
+
+
+def _build_config(index_type: str):
+    if index_type == "IVF_HNSW_SQ":
+        return HnswSq()
+    if index_type == "BTREE":
+        return BTree()
+    return IvfPq()
+
+
+async def _find_index(tbl, column: str):
+    for index in await tbl.list_indices():
+        if column in index.columns:
+            return index
+    return None
+
+
+async def ensure_vector_index(db, table_name: str) -> bool:
+    """
+    检查数据表的各向量列是否需要创建或重建向量索引，需要时直接构建
+
+    Args:
+        db: 数据库连接
+        table_name: 表名
+
+    Returns:
+        bool: 是否构建了索引
+    """
+    settings = VECTOR_INDEX_SETTINGS.get(table_name)
+    if not settings:
+        return False
+    tbl = await open_table(db.uri, table_name)
+    if tbl is None:
+        return False
+
+    schema_names = (await tbl.schema()).names
+    built = False
+    for column in settings.get("columns", [VECTOR_COLUMN]):
+        if column not in schema_names:
+            continue
+        index = await _find_index(tbl, column)
+
+        if index is None:
+            # 只统计该列有向量的行
+            if await tbl.count_rows(f"{column} IS NOT NULL") < settings["min_rows"]:
+                continue
+            print(f"为 {table_name}.{column} 创建向量索引 {settings['index_type']}")
+        else:
+            stats = await tbl.index_stats(index.name)
+            if stats is None or stats.num_unindexed_rows < settings["rebuild_rows"]:
+                continue
+            print(f"{table_name}.{column} 有 {stats.num_unindexed_rows} 行未进入索引，重建向量索引")
+
+        await tbl.create_index(column, replace=True, config=_build_config(settings["index_type"]))
+        built = True
+    return built
+
+
+async def ensure_scalar_indexes(db, table_name: str) -> List[str]:
+    """
+    为数据表的过滤列创建标量索引，新增行过多时重建
+
+    Args:
+        db: 数据库连接
+        table_name: 表名
+
+    Returns:
+        List[str]: 本次构建了索引的列
+    """
+    settings = SCALAR_INDEX_SETTINGS.get(table_name)
+    if not settings:
+        return []
+    tbl = await open_table(db.uri, table_name)
+    if tbl is None:
+        return []
+
+    schema_names = (await tbl.schema()).names
+    built = []
+    for column, index_type in settings.items():
+        if column not in schema_names:
+            continue
+        index = await _find_index(tbl, column)
+        if index is not None:
+            stats = await tbl.index_stats(index.name)
+            if stats is None or stats.num_unindexed_rows < SCALAR_INDEX_REBUILD_ROWS:
+                continue
+        await tbl.create_index(column, replace=True, config=_build_config(index_type))
+        built.append(column)
+
+    if built:
+        print(f"为 {table_name} 构建标量索引: {built}")
+    return built
+
+
+async def _run_index_check(db, table_name: str, key: str) -> None:
+    try:
+        await ensure_scalar_indexes(db, table_name)
+        await ensure_vector_index(db, table_name)
+    except Exception as e:
+        print(f"构建 {table_name} 索引时出错: {e}")
+    finally:
+        _building.discard(key)
+
+
+def schedule_index_check(db, table_name: str) -> None:
+    """
+    写入后在后台检查索引，不阻塞写入队列，只在后台事件循环中调用
+
+    Args:
+        db: 数据库连接
+        table_name: 表名
+    """
+    if table_name not in VECTOR_INDEX_SETTINGS and table_name not in SCALAR_INDEX_SETTINGS:
+        return
+    key = f"{os.path.abspath(db.uri)}:{table_name}"
+    if key in _building:
+        return
+    _building.add(key)
+    BackgroundLoop().add_shutdown_hook(wait_for_index_builds)
+    task = asyncio.ensure_future(_run_index_check(db, table_name, key))
+    _index_tasks[key] = task
+    task.add_done_callback(lambda _: _index_tasks.pop(key, None))
+
+
+async def wait_for_index_build(user_db_path: str, table_name: str) -> None:
+    """
+    等待数据表正在进行的后台索引构建结束，删除表或恢复版本之前调用，只在后台事件循环中调用
+
+    Args:
+        user_db_path: 用户数据库路径
+        table_name: 表名
+    """
+    task = _index_tasks.get(f"{os.path.abspath(user_db_path)}:{table_name}")
+    if task is not None:
+        await asyncio.wait([task])
+
+
+async def wait_for_index_builds() -> None:
+    """等待全部后台索引构建结束，进程退出时由 BackgroundLoop 调用"""
+    while _index_tasks:
+        await asyncio.wait(list(_index_tasks.values()))
@@ -0,0 +1,95 @@
+import os
+import asyncio
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.background_loop import BackgroundLoop
+from utils.constants import LLM_MAX_CONCURRENCY, LLM_MAX_CONCURRENCY_PER_USER
+
+
+class LLMConcurrencyLimiter:
+    """
+    限制同时进行中的大模型请求数
+
+    每个用户一个信号量，另有一个进程内的全局信号量。LLMProcessor 的调用是同步阻塞的，
+    取得两个信号量后放到线程中执行，不阻塞事件循环。
+    只能在同一个事件循环中使用（进程内由 BackgroundLoop 持有）。
+    """
+
+    def __init__(self, max_concurrency: int, max_concurrency_per_user: int):
+        """
+        Args:
+            max_concurrency: 全部用户同时进行中的请求上限
+            max_concurrency_per_user: 单个用户同时进行中的请求上限
+        """
+        self.max_concurrency_per_user = max_concurrency_per_user
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # 用户 -> (信号量, 正在使用或等待的请求数)，没有请求时删除
+        self.user_semaphores: Dict[str, Tuple[asyncio.Semaphore, int]] = {}
+
+    def _acquire_user(self, user_key: str) -> asyncio.Semaphore:
+        semaphore, users = self.user_semaphores.get(user_key, (None, 0))
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency_per_user)
+        self.user_semaphores[user_key] = (semaphore, users + 1)
+        return semaphore
+
+    def _release_user(self, user_key: str) -> None:
+        semaphore, users = self.user_semaphores[user_key]
+        if users <= 1:
+            del self.user_semaphores[user_key]
+        else:
+            self.user_semaphores[user_key] = (semaphore, users - 1)
+
+    async def run(self, user_key: Optional[str], fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在并发限制内于线程中执行同步函数
+
+        Args:
+            user_key: 用户标识，为空时只受全局限制
+            fn: 同步函数
+
+        Returns:
+            Any: fn 的返回值
+        """
+        if user_key is None:
+            async with self.semaphore:
+                return await asyncio.to_thread(fn, *args, **kwargs)
+
+        # 先取用户的信号量，同一用户排队中的请求不会占用全局名额
+        user_semaphore = self._acquire_user(user_key)
+        try:
+            async with user_semaphore:
+                async with self.semaphore:
+                    return await asyncio.to_thread(fn, *args, **kwargs)
+        finally:
+            self._release_user(user_key)
+
+
+_limiter = None
+
+
+def _get_limiter() -> LLMConcurrencyLimiter:
+    """进程内共用的并发限制，只在后台事件循环中使用"""
+    global _limiter
+    if _limiter is None:
+        _limiter = LLMConcurrencyLimiter(LLM_MAX_CONCURRENCY, LLM_MAX_CONCURRENCY_PER_USER)
+    return _limiter
+
+
+async def _run_limited(user_key: Optional[str], fn: Callable[..., Any], args, kwargs) -> Any:
+    return await _get_limiter().run(user_key, fn, *args, **kwargs)
+
+
+async def run_llm(user_db_path: Optional[str], fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    在每个用户和全局的并发限制内执行同步的大模型调用
+
+    Args:
+        user_db_path: 用户数据库路径，用作用户标识，为空时只受全局限制
+        fn: 同步函数，例如 LLMProcessor.generate_response
+
+    Returns:
+        Any: fn 的返回值
+    """
+    user_key = os.path.abspath(user_db_path) if user_db_path else None
+    return await BackgroundLoop().run(_run_limited(user_key, fn, args, kwargs))
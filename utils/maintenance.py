@@ -0,0 +1,130 @@
+import os
+import time
+import asyncio
+from datetime import timedelta
+from typing import Dict, Tuple
+
+from utils.db_pool import open_table
+from utils.index_manager import is_index_building
+from utils.constants import (MAINTENANCE_QUIET_SECONDS, MAINTENANCE_MIN_INTERVAL_SECONDS, MAINTENANCE_MAX_FRAGMENTS,
+                             MAINTENANCE_MAX_VERSIONS, MAINTENANCE_SIZE_GROWTH_RATIO, MAINTENANCE_KEEP_VERSIONS_HOURS)
+
+# 需要定期整理的数据表
+MAINTAINED_TABLES = ["detail_table", "event_table", "relations_table", "article_segment_emb_table"]
+
+# (数据库, 表) -> 上次整理的时间 / 上次整理后（或首次检查时）的磁盘统计
+# 旧版本的文件要等保留期过后才会删除，所以按整理之后新增的碎片和版本数判断
+_last_run: Dict[str, float] = {}
+_baseline: Dict[str, Dict[str, int]] = {}
+
+
+def _dir_stats(path: str) -> Tuple[int, int]:
+    """目录下的文件数和总字节数"""
+    count = 0
+    size = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    count += 1
+                    size += entry.stat().st_size
+    except FileNotFoundError:
+        pass
+    return count, size
+
+
+def table_disk_stats(user_db_path: str, table_name: str) -> Dict[str, int]:
+    """
+    从数据目录统计数据表的碎片数、版本数和磁盘占用，不需要打开数据表
+
+    Args:
+        user_db_path: 用户数据库路径
+        table_name: 表名
+
+    Returns:
+        Dict[str, int]: fragments、versions、bytes
+    """
+    table_dir = os.path.join(user_db_path, f"{table_name}.lance")
+    fragments, data_bytes = _dir_stats(os.path.join(table_dir, "data"))
+    versions, version_bytes = _dir_stats(os.path.join(table_dir, "_versions"))
+    _, index_bytes = _dir_stats(os.path.join(table_dir, "_indices"))
+    return {"fragments": fragments, "versions": versions, "bytes": data_bytes + version_bytes + index_bytes}
+
+
+def needs_maintenance(key: str, stats: Dict[str, int]) -> bool:
+    """上次整理后新增的碎片或版本过多，或者磁盘占用增长过多时需要整理"""
+    baseline = _baseline.get(key, {"fragments": 0, "versions": 0, "bytes": stats["bytes"]})
+    if stats["fragments"] - baseline["fragments"] >= MAINTENANCE_MAX_FRAGMENTS:
+        return True
+    if stats["versions"] - baseline["versions"] >= MAINTENANCE_MAX_VERSIONS:
+        return True
+    return stats["bytes"] >= baseline["bytes"] * MAINTENANCE_SIZE_GROWTH_RATIO
+
+
+async def optimize_table(db, table_name: str) -> None:
+    """合并小碎片、更新索引并清理旧版本"""
+    tbl = await open_table(db.uri, table_name)
+    if tbl is None:
+        return
+    stats = await tbl.optimize(cleanup_older_than=timedelta(hours=MAINTENANCE_KEEP_VERSIONS_HOURS))
+    print(f"整理 {table_name}: {stats}")
+
+
+async def _wait_until_idle(writer) -> None:
+    while True:
+        await asyncio.sleep(MAINTENANCE_QUIET_SECONDS)
+        if not writer.queue and time.monotonic() - writer.last_activity >= MAINTENANCE_QUIET_SECONDS:
+            return
+
+
+async def _maintain_when_idle(writer) -> None:
+    """等写入队列空闲一段时间后，依次检查各表并在写入队列中独占整理"""
+    try:
+        remaining = list(MAINTAINED_TABLES)
+        while remaining:
+            await _wait_until_idle(writer)
+
+            deferred = []
+            for table_name in remaining:
+                key = f"{writer.user_db_path}:{table_name}"
+                last_run = _last_run.get(key)
+                if last_run is not None and time.monotonic() - last_run < MAINTENANCE_MIN_INTERVAL_SECONDS:
+                    continue
+                # 有新的写入或索引正在构建时让路，等下次空闲再整理
+                if writer.queue or is_index_building(writer.user_db_path, table_name):
+                    deferred.append(table_name)
+                    continue
+
+                stats = await asyncio.to_thread(table_disk_stats, writer.user_db_path, table_name)
+                if stats["fragments"] == 0:
+                    continue
+                if not needs_maintenance(key, stats):
+                    _baseline.setdefault(key, {"fragments": 0, "versions": 0, "bytes": stats["bytes"]})
+                    continue
+
+                print(f"{table_name} 有 {stats['fragments']} 个碎片、{stats['versions']} 个版本，开始整理", writer.user_db_path)
+                _last_run[key] = time.monotonic()
+
+                async def optimize(db, table_name=table_name):
+                    await optimize_table(db, table_name)
+
+                await writer.submit_exclusive(optimize)
+                _baseline[key] = await asyncio.to_thread(table_disk_stats, writer.user_db_path, table_name)
+
+            remaining = deferred
+    except Exception as e:
+        print(f"整理数据库时出错: {e}", writer.user_db_path)
+    finally:
+        writer.maintenance_task = None
+
+
+def schedule_maintenance(writer) -> None:
+    """
+    写入队列处理完后调度整理，同一数据库同时只有一个等待中的整理任务，只在后台事件循环中调用
+
+    Args:
+        writer: 用户数据库的写入队列，需要 user_db_path、queue、last_activity、maintenance_task 和 submit_exclusive
+    """
+    if writer.maintenance_task is not None:
+        return
+    writer.maintenance_task = asyncio.ensure_future(_maintain_when_idle(writer))
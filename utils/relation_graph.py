@@ -0,0 +1,232 @@
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.db_pool import open_table
+from utils.user_cache import UserCache
+
+
+class RelationGraph:
+    """
+    单个用户的事件关系图
+
+    首次使用时从 relations_table 读取全部关系建立邻接表，之后随 save_relations 增量更新，
+    查询相邻事件、多跳扩展和最短路径都只访问内存。
+    """
+
+    def __init__(self, user_db_path: str):
+        self.user_db_path = user_db_path
+        self.loaded = False
+        self.lock = threading.Lock()
+        # 事件 -> {关联事件: 关系说明}，分别记录出边和入边
+        self.out_edges: Dict[str, Dict[str, str]] = {}
+        self.in_edges: Dict[str, Dict[str, str]] = {}
+        # 加载过程中保存的关系，加载完成后补上，避免读表之后写入的关系丢失
+        self.pending: List[Dict[str, Any]] = []
+
+    async def load(self) -> None:
+        """从 relations_table 加载全部关系，只在第一次使用时执行"""
+        if self.loaded:
+            return
+
+        tbl = await open_table(self.user_db_path, "relations_table")
+        rows = []
+        if tbl is not None:
+            result = await tbl.query().select(["event_1", "event_2", "relation"]).to_arrow()
+            columns = [result.column(name).to_pylist() for name in ["event_1", "event_2", "relation"]]
+            rows = [{'event_1': event_1, 'event_2': event_2, 'relation': relation}
+                    for event_1, event_2, relation in zip(*columns)]
+
+        with self.lock:
+            if self.loaded:
+                return
+            self._add(rows)
+            self._add(self.pending)
+            self.pending = []
+            self.loaded = True
+
+    def _add(self, relations: Iterable[Dict[str, Any]]) -> None:
+        """写入关系，调用方需持有锁"""
+        for relation in relations:
+            event_1, event_2 = relation['event_1'], relation['event_2']
+            self.out_edges.setdefault(event_1, {})[event_2] = relation.get('relation', '')
+            self.in_edges.setdefault(event_2, {})[event_1] = relation.get('relation', '')
+
+    def add(self, relations: List[Dict[str, Any]]) -> None:
+        """
+        写入新保存的关系，尚未加载时暂存，加载完成后补上
+
+        Args:
+            relations: 包含 event_1、event_2、relation 的关系列表
+        """
+        with self.lock:
+            if self.loaded:
+                self._add(relations)
+            else:
+                self.pending.extend(relations)
+
+    def _adjacent(self, event: str) -> List[str]:
+        """两个方向的相邻事件，调用方需持有锁"""
+        adjacent = list(self.out_edges.get(event, {}))
+        adjacent.extend(other for other in self.in_edges.get(event, {}) if other not in self.out_edges.get(event, {}))
+        return adjacent
+
+    def neighbours(self, event: str) -> List[Dict[str, str]]:
+        """
+        获取事件两个方向的相关事件
+
+        Args:
+            event: 事件名称
+
+        Returns:
+            List[Dict[str, str]]: event、reason，以及 direction（out 表示该事件指向对方，in 表示对方指向该事件）
+        """
+        with self.lock:
+            related = [{"event": other, "reason": reason, "direction": "out"}
+                       for other, reason in self.out_edges.get(event, {}).items()]
+            related.extend({"event": other, "reason": reason, "direction": "in"}
+                           for other, reason in self.in_edges.get(event, {}).items())
+        return related
+
+    def degrees(self) -> Dict[str, int]:
+        """每个事件两个方向关联的事件数"""
+        with self.lock:
+            events = set(self.out_edges) | set(self.in_edges)
+            return {event: len(self._adjacent(event)) for event in events}
+
+    def _edges_between(self, nodes: Iterable[str]) -> List[Dict[str, str]]:
+        """节点集合内部的全部边，调用方需持有锁"""
+        node_set = set(nodes)
+        return [{"source": source, "target": target, "relation": relation}
+                for source in node_set
+                for target, relation in self.out_edges.get(source, {}).items()
+                if target in node_set]
+
+    def k_hop(self, event: str, hops: int, max_nodes: int) -> Dict[str, Any]:
+        """
+        从事件出发按两个方向广度优先扩展 hops 跳
+
+        Args:
+            event: 起始事件
+            hops: 最大跳数
+            max_nodes: 最多返回的节点数，超过时按距离截断
+
+        Returns:
+            Dict[str, Any]: nodes（event、distance）、edges（source、target、relation），以及是否被截断 truncated
+        """
+        with self.lock:
+            distances = {event: 0}
+            queue = deque([event])
+            truncated = False
+            while queue:
+                current = queue.popleft()
+                if distances[current] == hops:
+                    continue
+                for other in self._adjacent(current):
+                    if other in distances:
+                        continue
+                    if len(distances) >= max_nodes:
+                        truncated = True
+                        queue.clear()
+                        break
+                    distances[other] = distances[current] + 1
+                    queue.append(other)
+
+            nodes = [{"event": node, "distance": distance} for node, distance in distances.items()]
+            return {"nodes": nodes, "edges": self._edges_between(distances), "truncated": truncated}
+
+    def shortest_path(self, source: str, target: str, max_depth: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        查找两个事件之间不考虑方向的最短路径
+
+        从两端同时广度优先搜索，每次扩展较小的一侧。
+
+        Args:
+            source: 起点事件
+            target: 终点事件
+            max_depth: 路径的最大边数
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: 路径上依次经过的边（source、target、relation，保持关系原本的方向），
+            起点与终点相同时为空列表，不连通时为 None
+        """
+        if source == target:
+            return []
+
+        with self.lock:
+            parents_from_source: Dict[str, Optional[str]] = {source: None}
+            parents_from_target: Dict[str, Optional[str]] = {target: None}
+            frontier_source, frontier_target = [source], [target]
+            meeting = None
+            depth = 0
+
+            while frontier_source and frontier_target and depth < max_depth and meeting is None:
+                # 扩展较小的一侧
+                if len(frontier_source) <= len(frontier_target):
+                    frontier, parents, others = frontier_source, parents_from_source, parents_from_target
+                else:
+                    frontier, parents, others = frontier_target, parents_from_target, parents_from_source
+
+                next_frontier = []
+                for current in frontier:
+                    for other in self._adjacent(current):
+                        if other in parents:
+                            continue
+                        parents[other] = current
+                        if other in others:
+                            meeting = other
+                            break
+                        next_frontier.append(other)
+                    if meeting is not None:
+                        break
+
+                if frontier is frontier_source:
+                    frontier_source = next_frontier
+                else:
+                    frontier_target = next_frontier
+                depth += 1
+
+            if meeting is None:
+                return None
+
+            path = [meeting]
+            node = parents_from_source[meeting]
+            while node is not None:
+                path.insert(0, node)
+                node = parents_from_source[node]
+            node = parents_from_target[meeting]
+            while node is not None:
+                path.append(node)
+                node = parents_from_target[node]
+
+            edges = []
+            for first, second in zip(path, path[1:]):
+                if second in self.out_edges.get(first, {}):
+                    edges.append({"source": first, "target": second, "relation": self.out_edges[first][second]})
+                else:
+                    edges.append({"source": second, "target": first, "relation": self.out_edges[second][first]})
+            return edges
+
+
+# 长时间未使用或超过用户数上限的关系图被淘汰，下次使用时从 relations_table 重新加载
+_graphs = UserCache()
+
+
+async def get_relation_graph(user_db_path: str) -> RelationGraph:
+    """获取用户的事件关系图，进程内每个数据库只加载一次"""
+    graph = _graphs.get(user_db_path, RelationGraph)
+    await graph.load()
+    return graph
+
+
+def add_relations(user_db_path: str, relations: List[Dict[str, Any]]) -> None:
+    """
+    保存关系后同步到内存中的关系图，关系图不在内存中时不创建，下次加载时会从表中读到
+
+    Args:
+        user_db_path: 用户数据库路径
+        relations: 包含 event_1、event_2、relation 的关系列表
+    """
+    graph = _graphs.get(user_db_path)
+    if graph is not None:
+        graph.add(relations)
@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+
+# 与 text-embedding-v3 请求的向量维度一致
+VECTOR_DIMENSIONS = 1024
+VECTOR_TYPE = pa.list_(pa.float32(), VECTOR_DIMENSIONS)
+
+# detail_table 中需要语义检索的字段，每个字段有自己的向量列，时间和人物只作为普通列保存
+EMBEDDED_FIELDS = ["summary", "character_thought", "author_view"]
+
+
+def vector_column(field: str) -> str:
+    """语义字段对应的向量列名"""
+    return f"{field}_vector"
+
+
+# 各数据表的列定义，建表和写入都按这里的类型构建 Arrow 数据，不再从第一批数据推断
+# detail_table 每个事件的每个来源文件一行，字段为空时对应的向量列也为空
+TABLE_SCHEMAS: Dict[str, pa.Schema] = {
+    "detail_table": pa.schema([
+        pa.field("event", pa.string()),
+        pa.field("title", pa.string()),
+        pa.field("time", pa.string()),
+        pa.field("figure", pa.list_(pa.string())),
+        *[pa.field(field, pa.string()) for field in EMBEDDED_FIELDS],
+        pa.field("start_year", pa.int64()),
+        pa.field("end_year", pa.int64()),
+        *[pa.field(vector_column(field), VECTOR_TYPE) for field in EMBEDDED_FIELDS],
+    ]),
+    "event_table": pa.schema([
+        pa.field("vector", VECTOR_TYPE),
+        pa.field("event", pa.string()),
+        pa.field("time", pa.string()),
+    ]),
+    "relations_table": pa.schema([
+        pa.field("event_1", pa.string()),
+        pa.field("event_2", pa.string()),
+        pa.field("relation", pa.string()),
+    ]),
+    "article_segment_emb_table": pa.schema([
+        pa.field("vector", VECTOR_TYPE),
+        pa.field("item", pa.string()),
+        pa.field("summary", pa.string()),
+        pa.field("chunk", pa.string()),
+        pa.field("doc_title", pa.string()),
+        pa.field("flag", pa.int64()),
+    ]),
+}
+
+
+def _vector_array(vectors: List[Optional[List[float]]], dimensions: int) -> pa.Array:
+    """一次把全部向量转成连续的 float32 数组，再按维度切分成定长列表，空向量记为空值"""
+    if not vectors:
+        return pa.array([], type=pa.list_(pa.float32(), dimensions))
+    mask = [vector is None for vector in vectors]
+    if any(mask):
+        zeros = [0.0] * dimensions
+        vectors = [zeros if vector is None else vector for vector in vectors]
+    values = np.asarray(vectors, dtype=np.float32)
+    if values.ndim != 2 or values.shape[1] != dimensions:
+        raise ValueError(f"向量维度不是 {dimensions}: {values.shape}")
+    return pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), dimensions,
+                                             mask=pa.array(mask) if any(mask) else None)
+
+
+def make_table(table_name: str, columns: Dict[str, List[Any]]) -> pa.Table:
+    """
+    按数据表的列定义把按列组织的数据构建成 Arrow 表
+
+    Args:
+        table_name: 表名
+        columns: 列名 -> 该列的值，缺少的列填空值
+
+    Returns:
+        pa.Table: 列顺序和类型与 TABLE_SCHEMAS 一致
+    """
+    schema = TABLE_SCHEMAS[table_name]
+    num_rows = len(next(iter(columns.values()))) if columns else 0
+
+    arrays = []
+    for field in schema:
+        values = columns.get(field.name)
+        if values is None:
+            arrays.append(pa.nulls(num_rows, field.type))
+        elif pa.types.is_fixed_size_list(field.type):
+            arrays.append(_vector_array(values, field.type.list_size))
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_batches([pa.RecordBatch.from_arrays(arrays, schema=schema)], schema=schema)
+
+
+def rows_to_table(table_name: str, rows: List[Dict[str, Any]]) -> pa.Table:
+    """把逐行的字典转换成 Arrow 表，只用于从已有数据读出的行"""
+    return make_table(table_name, {name: [row.get(name) for row in rows] for name in TABLE_SCHEMAS[table_name].names})
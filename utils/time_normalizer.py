@@ -0,0 +1,199 @@
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# 常见年号的元年（公历年份）
+REIGN_ERAS = {
+    # 清
+    "顺治": 1644, "康熙": 1662, "雍正": 1723, "乾隆": 1736, "嘉庆": 1796,
+    "道光": 1821, "咸丰": 1851, "同治": 1862, "光绪": 1875, "宣统": 1909,
+    # 明
+    "洪武": 1368, "建文": 1399, "永乐": 1403, "洪熙": 1425, "宣德": 1426,
+    "正统": 1436, "景泰": 1450, "天顺": 1457, "成化": 1465, "弘治": 1488,
+    "正德": 1506, "嘉靖": 1522, "隆庆": 1567, "万历": 1573, "泰昌": 1620,
+    "天启": 1621, "崇祯": 1628,
+    # 唐、宋等常见年号
+    "贞观": 627, "永徽": 650, "开元": 713, "天宝": 742, "元和": 806,
+    "建隆": 960, "庆历": 1041, "熙宁": 1068, "元丰": 1078, "靖康": 1126,
+    "绍兴": 1131, "至元": 1264,
+    # 汉
+    "建元": -140, "元狩": -122, "太初": -104, "建武": 25, "建安": 196,
+}
+
+CHINESE_DIGITS = {"零": 0, "〇": 0, "○": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+                  "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+CHINESE_UNITS = {"十": 10, "百": 100, "千": 1000}
+
+NUMBER = r"[0-9零〇○一二两三四五六七八九十百千]+"
+ERA_NAMES = "|".join(sorted(REIGN_ERAS, key=len, reverse=True))
+# 单独的"前"只在开头时表示公元前，避免把"战前1937年"解析成公元前
+BC = r"(公元前|^前)"
+
+RANGE_SEPARATOR = re.compile(r"\s*(?:-|－|—|–|~|～|至|到)+\s*")
+# 只有第二段是 1-12 时才当作年月，"1927-28" 是年份范围
+DATE = re.compile(r"^\s*(\d{3,4})[-/.](?:0?[1-9]|1[0-2])(?:[-/.]\d{1,2})?\s*$")
+# 范围后半段省略世纪的年份，例如 "1927-28" 中的 28
+SHORT_YEAR = re.compile(r"^(\d{1,2})年?$")
+CENTURY_DECADE = re.compile(rf"{BC}?({NUMBER})世纪({NUMBER})年代")
+CENTURY = re.compile(rf"{BC}?({NUMBER})世纪")
+DECADE = re.compile(rf"{BC}?({NUMBER})年代")
+MINGUO = re.compile(rf"民国({NUMBER}|元)年?")
+ERA_YEAR = re.compile(rf"({ERA_NAMES})({NUMBER}|元)年")
+# 数字前是"第"、后面是"后/前/间/万"时表示序数或时长（"第三年"、"三年后"、"200万年前"），不是年份，
+# "年前后"表示大约在该年，仍然接受
+NOT_YEAR_SUFFIX = r"(?:[后间万]|前(?!后))"
+YEAR = re.compile(rf"(?<![第0-9零〇○一二两三四五六七八九十百千])(公元前|^前|公元)?({NUMBER})年(?!{NOT_YEAR_SUFFIX})")
+BARE_YEAR = re.compile(rf"(?<![第0-9])(公元前|^前|公元)?(\d{{3,4}})(?![0-9万]|年{NOT_YEAR_SUFFIX})")
+
+
+def chinese_to_int(text: str) -> Optional[int]:
+    """
+    将阿拉伯数字或中文数字转换为整数
+
+    支持 "1928"、"一九二八"、"二十三"、"一千二百" 等写法。
+    """
+    if not text:
+        return None
+    if text.isdigit():
+        return int(text)
+    if text == "元":
+        return 1
+
+    # 逐位写法，例如 一九二八
+    if all(char in CHINESE_DIGITS for char in text):
+        return int("".join(str(CHINESE_DIGITS[char]) for char in text))
+
+    total = 0
+    current = 0
+    for char in text:
+        if char in CHINESE_DIGITS:
+            current = CHINESE_DIGITS[char]
+        elif char in CHINESE_UNITS:
+            total += (current or 1) * CHINESE_UNITS[char]
+            current = 0
+        elif char.isdigit():
+            current = current * 10 + int(char)
+        else:
+            return None
+    return total + current
+
+
+def _parse_point(text: str) -> Optional[Tuple[int, int]]:
+    """解析单个时间表述，返回 (起始年, 结束年)"""
+    match = CENTURY_DECADE.search(text)
+    if match:
+        century = chinese_to_int(match.group(2))
+        decade = chinese_to_int(match.group(3))
+        if century is not None and decade is not None:
+            start = (century - 1) * 100 + decade
+            if match.group(1):
+                return -(start + 9), -start
+            return start, start + 9
+
+    match = CENTURY.search(text)
+    if match:
+        century = chinese_to_int(match.group(2))
+        if century is not None:
+            if match.group(1):
+                return -century * 100, -(century - 1) * 100 - 1
+            return (century - 1) * 100 + 1, century * 100
+
+    match = DECADE.search(text)
+    if match:
+        decade = chinese_to_int(match.group(2))
+        if decade is not None:
+            if match.group(1):
+                return -(decade + 9), -decade
+            # 两位数的年代（如"20年代"）默认指二十世纪
+            if decade < 100:
+                decade += 1900
+            return decade, decade + 9
+
+    match = MINGUO.search(text)
+    if match:
+        year = chinese_to_int(match.group(1))
+        if year is not None:
+            return 1911 + year, 1911 + year
+
+    match = ERA_YEAR.search(text)
+    if match:
+        year = chinese_to_int(match.group(2))
+        if year is not None:
+            year = REIGN_ERAS[match.group(1)] + year - 1
+            return year, year
+
+    match = next((match for match in YEAR.finditer(text) if _is_year_number(match.group(1), match.group(2))), None)
+    match = match or BARE_YEAR.search(text)
+    if match:
+        year = chinese_to_int(match.group(2))
+        if year is not None:
+            if match.group(1) in ("公元前", "前"):
+                year = -year
+            return year, year
+
+    return None
+
+
+def _is_year_number(prefix: Optional[str], number: str) -> bool:
+    """
+    "年"前的数字是否是年份
+
+    阿拉伯数字都接受；中文数字只在有"公元"前缀或逐位写出至少三位（一九二八）时接受，
+    "三年"、"二十年"这类写法多半是时长。
+    """
+    if number.isdigit():
+        return True
+    if prefix in ("公元", "公元前"):
+        return True
+    return len(number) >= 3 and all(char in CHINESE_DIGITS for char in number)
+
+
+@lru_cache(maxsize=4096)
+def normalize_time(text: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    将中文时间表述转换为起止年份，公元前用负数表示
+
+    支持公元前、民国纪年、常见年号、"1927-1937"/"1927年至1937年" 这类范围、
+    年代（"1920年代"、"20世纪30年代"）和世纪。
+
+    Args:
+        text: 时间表述
+
+    Returns:
+        Tuple[Optional[int], Optional[int]]: (start_year, end_year)，无法解析时为 (None, None)
+    """
+    if not text:
+        return None, None
+    text = str(text).strip()
+
+    # 1928-06-04 这类日期不是范围
+    match = DATE.match(text)
+    if match:
+        year = int(match.group(1))
+        return year, year
+
+    parts = [part for part in RANGE_SEPARATOR.split(text) if part]
+    if len(parts) >= 2:
+        start = _parse_point(parts[0])
+        end = _parse_point(parts[-1])
+        short_year = SHORT_YEAR.match(parts[-1])
+        if start and start[1] >= 100 and short_year:
+            # "1927-28" 后半段沿用前半段的世纪，比前半段小时进到下一个世纪（"1998-25"）
+            century = start[1] - start[1] % 100
+            year = century + int(short_year.group(1))
+            if year < start[1]:
+                year += 100
+            end = (year, year)
+        if start and end:
+            # "公元前221-前206年" 这类写法，前半段沿用后半段的公元前
+            if end[0] < 0 and start[0] > 0 and not re.search("公元前|前", parts[0]):
+                start = (-start[1], -start[0])
+            # "公元前221年-206年" 这类写法，后半段沿用前半段的公元前
+            elif start[0] < 0 and end[0] > 0 and "公元" not in parts[-1] and end[1] < -start[0]:
+                end = (-end[1], -end[0])
+            return min(start[0], end[0]), max(start[1], end[1])
+
+    point = _parse_point(text)
+    if point is None:
+        return None, None
+    return point
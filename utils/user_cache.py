@@ -0,0 +1,101 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional
+
+from utils.constants import USER_CACHE_MAX_USERS, USER_CACHE_IDLE_SECONDS
+
+
+class UserCache:
+    """
+    按用户数据库路径缓存的进程内对象
+
+    与 LanceDBPool 相同，按最近使用顺序保存 (对象, 最近使用时间)，超过上限时淘汰最久未使用的，
+    长时间未使用的在下次访问时清理。evictable 返回 False 的对象（例如还有排队中的写入）暂不淘汰。
+    """
+
+    def __init__(self, evictable: Optional[Callable[[Any], bool]] = None,
+                 max_users: int = USER_CACHE_MAX_USERS, idle_seconds: float = USER_CACHE_IDLE_SECONDS):
+        self.evictable = evictable
+        self.max_users = max_users
+        self.idle_seconds = idle_seconds
+        self.lock = threading.Lock()
+        # 路径 -> (对象, 最近使用时间)
+        self.items = OrderedDict()
+        self.last_sweep = time.monotonic()
+
+    def _can_evict(self, item: Any) -> bool:
+        return self.evictable is None or self.evictable(item)
+
+    def _sweep(self, now: float) -> None:
+        """清理长时间未使用的对象，调用方需持有锁"""
+        if now - self.last_sweep < self.idle_seconds / 10:
+            return
+        self.last_sweep = now
+        for key, (item, last_used) in list(self.items.items()):
+            if now - last_used < self.idle_seconds:
+                break
+            if self._can_evict(item):
+                del self.items[key]
+
+    def _trim(self, keep: str) -> None:
+        """超过上限时从最久未使用的开始淘汰，保留刚加入的 keep，调用方需持有锁"""
+        for key, (item, _) in list(self.items.items()):
+            if len(self.items) <= self.max_users:
+                break
+            if key != keep and self._can_evict(item):
+                del self.items[key]
+
+    def get(self, user_db_path: str, factory: Optional[Callable[[str], Any]] = None) -> Optional[Any]:
+        """
+        取出缓存并更新最近使用时间
+
+        Args:
+            user_db_path: 用户数据库路径
+            factory: 不存在时用绝对路径创建对象，为空时不创建
+
+        Returns:
+            缓存的对象，不存在且没有 factory 时为 None
+        """
+        key = os.path.abspath(user_db_path)
+        now = time.monotonic()
+        with self.lock:
+            self._sweep(now)
+            item = self.items.get(key)
+            if item is None:
+                if factory is None:
+                    return None
+                created = factory(key)
+                self.items[key] = (created, now)
+                self._trim(key)
+                return created
+            self.items[key] = (item[0], now)
+            self.items.move_to_end(key)
+            return item[0]
+
+    def put(self, user_db_path: str, item: Any) -> None:
+        """
+        写入或替换缓存的对象
+
+        Args:
+            user_db_path: 用户数据库路径（或该用户目录下的文件路径）
+            item: 要缓存的对象
+        """
+        key = os.path.abspath(user_db_path)
+        now = time.monotonic()
+        with self.lock:
+            self._sweep(now)
+            self.items[key] = (item, now)
+            self.items.move_to_end(key)
+            self._trim(key)
+
+    def pop(self, user_db_path: str) -> None:
+        """丢弃数据库对应的缓存"""
+        with self.lock:
+            self.items.pop(os.path.abspath(user_db_path), None)
+
+    def values(self) -> List[Any]:
+        """当前缓存的全部对象"""
+        with self.lock:
+            return [item for item, _ in self.items.values()]